@@ -0,0 +1,39 @@
+# benchmarks/crowd_engine.py
+"""
+Array engine (src/model/crowd.py) vs one Mesa Evacuee per agent, timed on a
+crowded grid. That both give the very same seeded run is checked by
+tests/test_crowd_engine.py.
+
+    python -m benchmarks.crowd_engine
+"""
+import atexit
+import shutil
+import tempfile
+import time
+from src.model.simulation import EvacuationModel
+
+REPORTS = tempfile.mkdtemp(prefix="evacuation_bench_")  # reports written while benchmarking
+atexit.register(shutil.rmtree, REPORTS, ignore_errors=True)
+
+
+def time_ticks(engine, num_agents, ticks=100):
+    model = EvacuationModel(220, 180, num_agents=num_agents, active_areas=[0, 1, 2], seed=0, engine=engine,
+                            reports_dir=REPORTS)
+    t0 = time.perf_counter()
+    taken = 0
+    while model.running and taken < ticks:
+        model.step()
+        taken += 1
+    return (time.perf_counter() - t0) / taken
+
+
+def main():
+    for num_agents in (480, 5000, 15000):
+        mesa_t = time_ticks("mesa", num_agents)
+        array_t = time_ticks("array", num_agents)
+        print(f"{num_agents:>6} agents: mesa {1e3 * mesa_t:7.2f} ms/tick, "
+              f"array {1e3 * array_t:6.2f} ms/tick ({mesa_t / array_t:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/incremental_field.py
+"""
+Incremental LPA* repair vs full Dijkstra recomputation of the routing field,
+on the 220x180 grid with all three risk areas active.
+
+    python -m benchmarks.incremental_field
+"""
+import atexit
+import shutil
+import tempfile
+import time
+import numpy as np
+from src.model.simulation import EvacuationModel
+from src.utils.incremental_field import IncrementalDistanceField
+from src.utils.pathfinding import distance_field
+
+REPORTS = tempfile.mkdtemp(prefix="evacuation_bench_")  # reports written while benchmarking
+atexit.register(shutil.rmtree, REPORTS, ignore_errors=True)
+
+
+def main():
+    model = EvacuationModel(220, 180, num_agents=480, active_areas=[0, 1, 2], reports_dir=REPORTS)
+    model.step()
+    field = IncrementalDistanceField(
+        model.width, model.height, model.exits,
+        path_mask=model.path_mask,
+        obstacle_mask=model.current_step_combined_obstacle_mask,
+    )
+    full_t, inc_t, changed, expanded = [], [], [], []
+    for _ in range(150):
+        before = model.current_step_combined_obstacle_mask
+        model.step()
+        mask = model.current_step_combined_obstacle_mask
+        if not model.running:
+            break
+
+        t0 = time.perf_counter()
+        dist, next_hop = distance_field(
+            model.width, model.height, model.exits,
+            path_mask=model.path_mask, obstacle_mask=mask,
+        )
+        full_t.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        field.update_mask(mask)
+        inc_t.append(time.perf_counter() - t0)
+        changed.append(int((before != mask).sum()))
+        expanded.append(field.expanded)
+        assert np.array_equal(dist, field.dist), "incremental field diverged"
+        assert np.array_equal(next_hop, field.next_hop), "incremental next hops diverged"
+
+    print(f"ticks:                {len(full_t)}")
+    print(f"changed cells / tick: {np.mean(changed):.1f}")
+    print(f"expanded / tick:      {np.mean(expanded):.1f} of {model.width * model.height}")
+    print(f"full recompute:       {1e3 * np.mean(full_t):.2f} ms/tick")
+    print(f"incremental repair:   {1e3 * np.mean(inc_t):.2f} ms/tick")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/resolution.py
+"""
+Cost / accuracy of the grid resolution: the same seeded scenario (480 people,
+all risk areas) on grids of growing cell size, against the finest one.
+Times are in seconds of simulated time, so every grid is comparable.
+
+    python -m benchmarks.resolution
+"""
+import shutil
+import tempfile
+import time
+import numpy as np
+from src.model.simulation import EvacuationModel
+from src.utils.scenario import GridConfig, load_scenario
+
+CELL_SIZES = [0.5, 0.75, None, 1.5, 2.0, 3.0]   # metres, None = the native 220x180 grid
+SEEDS = range(10)
+NUM_AGENTS = 480
+
+
+def outcome(model):
+    """
+    shares evacuated / impacted / stuck and mean evacuation time (s) of one finished run
+    """
+    rep = model.reporter
+    n = rep.size
+    evacuated = rep.evacuated[:n]
+    return np.array([
+        evacuated.mean(),
+        rep.impacted_by_landslide[:n].mean(),
+        rep.stuck[:n].mean(),
+        rep.time_spent[:n][evacuated].mean() * model.time_per_step if evacuated.any() else np.nan,
+    ])
+
+
+def main():
+    reports = tempfile.mkdtemp(prefix="evacuation_resolution_")
+    rows = []
+    for cell_size in CELL_SIZES:
+        grid = GridConfig() if cell_size is None else GridConfig.from_cell_size(cell_size)
+        load_scenario(grid.width, grid.height)
+        outcomes, seconds, ticks = [], [], []
+        for seed in SEEDS:
+            t0 = time.perf_counter()
+            model = EvacuationModel(grid.width, grid.height, num_agents=NUM_AGENTS, seed=seed,
+                                    engine="array", reports_dir=reports)
+            model.run_until_done()
+            seconds.append(time.perf_counter() - t0)
+            ticks.append(model.current_step)
+            outcomes.append(outcome(model))
+        rows.append((grid, np.mean(seconds), np.mean(ticks), np.nanmean(outcomes, axis=0)))
+    shutil.rmtree(reports, ignore_errors=True)
+
+    reference = rows[0][3]
+    print(f"{'grid':>9} {'cell m':>6} {'s/run':>7} {'ticks':>6} "
+          f"{'evacuated':>9} {'impacted':>8} {'stuck':>6} {'evac s':>7} {'max err':>7}")
+    for grid, seconds, ticks, (evacuated, impacted, stuck, evac_time) in rows:
+        # largest gap to the finest grid among the three outcome shares
+        err = np.abs(np.array([evacuated, impacted, stuck]) - reference[:3]).max()
+        print(f"{grid.width:>4}x{grid.height:<4} {grid.cell_size:6.2f} {seconds:7.2f} {ticks:6.0f} "
+              f"{evacuated:9.3f} {impacted:8.3f} {stuck:6.3f} {evac_time:7.1f} {err:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
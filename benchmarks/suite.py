@@ -0,0 +1,243 @@
+# benchmarks/suite.py
+"""
+Timings of the simulation core on fixed seeds: model construction, ticks per
+second (480 and 5000 agents, with and without landslides), one A* query across
+the whole grid, landslide spreading and the csv report.
+They run on the native 220x180 grid and on finer grids of the same map
+(440x360, 880x720, layers rasterized and resampled for them by
+src/utils/scenario.py), so that scaling regressions show up too.
+
+Each run appends one JSON line to benchmarks/history.jsonl (commit, machine,
+seconds per tick / call of every benchmark) and is compared with the last
+run recorded on the same machine.
+
+    python -m benchmarks.suite                  # everything
+    python -m benchmarks.suite -k ticks -k 880  # only names containing one of these
+    python -m benchmarks.suite --quick          # fewer repeats, nothing recorded
+"""
+import argparse
+import atexit
+import functools
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from src.model.simulation import EvacuationModel
+from src.utils.pathfinding import a_star_path, distance_field
+from src.utils.scenario import NATIVE_HEIGHT, NATIVE_WIDTH, load_scenario
+
+WIDTH, HEIGHT = NATIVE_WIDTH, NATIVE_HEIGHT
+SEED = 0
+SCALES = (1, 2, 4)   # 220x180, 440x360, 880x720
+TICKS = 50           # ticks timed per repeat
+LANDSLIDE_TICKS = 60
+HISTORY = Path("benchmarks/history.jsonl")
+SLOWER, FASTER = 1.25, 0.8   # median ratios flagged against the previous run
+
+REPORTS = tempfile.mkdtemp(prefix="evacuation_bench_")  # reports written while benchmarking
+atexit.register(shutil.rmtree, REPORTS, ignore_errors=True)
+
+
+@functools.lru_cache(maxsize=None)
+def scenario(scale):
+    return load_scenario(WIDTH * scale, HEIGHT * scale)
+
+
+def make_model(scale=1, **kwargs):
+    kwargs.setdefault("seed", SEED)
+    return EvacuationModel(WIDTH * scale, HEIGHT * scale, scenario=scenario(scale), reports_dir=REPORTS, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def finished_model(num_agents):
+    model = make_model(num_agents=num_agents, engine="array")
+    model.run_until_done()
+    return model
+
+
+# each benchmark is (name, unit, setup): setup() prepares a fresh state and returns
+# the call to time, which returns how many units (ticks, calls) it went through
+
+def construction(scale, num_agents):
+    def setup():
+        scenario(scale)  # built beforehand, the model opens the cached bundle itself as every run does
+        kwargs = dict(num_agents=num_agents, seed=SEED, reports_dir=REPORTS)
+
+        def run():
+            EvacuationModel(WIDTH * scale, HEIGHT * scale, **kwargs)
+            return 1
+        return run
+    return setup
+
+
+def ticks(scale, num_agents, enable_landslide, engine="mesa"):
+    def setup():
+        model = make_model(scale, num_agents=num_agents, enable_landslide=enable_landslide, engine=engine)
+        model.step()  # the first tick builds the routing field
+
+        def run():
+            taken = 0
+            while model.running and taken < TICKS:
+                model.step()
+                taken += 1
+            return taken
+        return run
+    return setup
+
+
+def astar(scale):
+    def setup():
+        model = make_model(scale, num_agents=0)
+        # from the reachable cell farthest from the safe zone
+        dist, _ = distance_field(model.width, model.height, model.exits,
+                                 path_mask=model.path_mask, obstacle_mask=model.obstacle_mask)
+        y, x = np.unravel_index(np.argmax(np.where(np.isfinite(dist), dist, -1)), dist.shape)
+        start = (int(x), int(y))
+
+        def run():
+            a_star_path(model.grid, start, model.safe_zone,
+                        path_mask=model.path_mask, obstacle_mask=model.obstacle_mask)
+            return 1
+        return run
+    return setup
+
+
+def landslides(scale, num_agents):
+    def setup():
+        model = make_model(scale, num_agents=num_agents)
+
+        def run():
+            for _ in range(LANDSLIDE_TICKS):
+                for wave in model.landslides:
+                    wave.step()
+            return LANDSLIDE_TICKS
+        return run
+    return setup
+
+
+def save_report(num_agents):
+    def setup():
+        model = finished_model(num_agents)
+
+        def run():
+            model.reporter.save_report("all_done")
+            return 1
+        return run
+    return setup
+
+
+def benchmarks():
+    yield "construction_220x180_480", "call", construction(1, 480)
+    yield "construction_220x180_5000", "call", construction(1, 5000)
+    for agents in (480, 5000):
+        for enable in (True, False):
+            name = f"ticks_220x180_{agents}_{'landslide' if enable else 'no_landslide'}"
+            yield name, "tick", ticks(1, agents, enable)
+    yield "ticks_220x180_5000_landslide_array", "tick", ticks(1, 5000, True, engine="array")
+    yield "astar_220x180", "call", astar(1)
+    yield "landslide_step_220x180", "tick", landslides(1, 480)
+    yield "save_report_5000", "call", save_report(5000)
+    for scale in SCALES[1:]:
+        size = f"{WIDTH * scale}x{HEIGHT * scale}"
+        yield f"construction_{size}_5000", "call", construction(scale, 5000)
+        yield f"ticks_{size}_5000_landslide", "tick", ticks(scale, 5000, True)
+        yield f"ticks_{size}_5000_landslide_array", "tick", ticks(scale, 5000, True, engine="array")
+        yield f"astar_{size}", "call", astar(scale)
+        yield f"landslide_step_{size}", "tick", landslides(scale, 5000)
+
+
+def measure(setup, repeat):
+    """
+    seconds per unit of each repeat, every repeat on a fresh setup
+    """
+    times = []
+    for _ in range(repeat):
+        call = setup()
+        t0 = time.perf_counter()
+        units = call()
+        times.append((time.perf_counter() - t0) / units)
+    return times
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def previous_run(path, machine):
+    """
+    results of the last run recorded on this machine, {} if none
+    """
+    if not path.exists():
+        return {}
+    last = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["machine"] == machine:
+                last = entry["results"]
+    return last
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the simulation core")
+    parser.add_argument("-k", action="append", default=[], metavar="PATTERN",
+                        help="only run benchmarks whose name contains PATTERN (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="repeats per benchmark (median is kept)")
+    parser.add_argument("--quick", action="store_true", help="2 repeats and no history entry")
+    parser.add_argument("--history", type=Path, default=HISTORY, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+    repeat = 2 if args.quick else args.repeat
+
+    machine = f"{platform.node()} {platform.machine()} {platform.processor() or platform.system()}"
+    previous = previous_run(args.history, machine)
+
+    results = {}
+    for name, unit, setup in benchmarks():
+        if args.k and not any(p in name for p in args.k):
+            continue
+        times = measure(setup, repeat)
+        median = statistics.median(times)
+        results[name] = {"unit": unit, "median": median, "min": min(times), "repeat": repeat}
+
+        line = f"{name:<40} {1e3 * median:10.2f} ms/{unit:<4} (min {1e3 * min(times):.2f})"
+        if unit == "tick":
+            line += f" {1 / median:8.1f} ticks/s"
+        if name in previous:
+            ratio = median / previous[name]["median"]
+            flag = "  slower" if ratio > SLOWER else "  faster" if ratio < FASTER else ""
+            line += f"  {ratio:5.2f}x last run{flag}"
+        print(line)
+
+    if args.quick or not results:
+        return
+    commit, dirty = git_commit()
+    entry = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "dirty": dirty,
+        "machine": machine,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "seed": SEED,
+        "results": results,
+    }
+    args.history.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.history, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    print(f"results appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import logging
 from mesa import Agent
-from src.mobility import MobilityType
+from src.mobility import MOBILITY_TYPES, MobilityType
+
+logger = logging.getLogger(__name__)
 
 class Evacuee(Agent):
     def __init__(self, unique_id, model, mobility_type=MobilityType.NON_PWD):
@@ -8,7 +11,7 @@ class Evacuee(Agent):
         """
         super().__init__(unique_id, model)
         self.mobility_type = mobility_type
-        self.base_speed = float(getattr(mobility_type, 'speed', 1.0)) 
+        self.base_speed = float(model.mobility_speeds[MOBILITY_TYPES.index(mobility_type)])
         self.color = getattr(mobility_type, 'color', "#FFFFFF")
 
         self.evacuation_started     = False
@@ -19,8 +22,8 @@ class Evacuee(Agent):
 
         self.stuck_counter = 0
         self.previous_pos = None
-        # max steps an agent tries to move into a landslide before being marked stuck
-        self.max_stuck_threshold = 40   # will use more than n of steps for no landslide and 200 for activate areas
+        # max steps an agent tries to move into a landslide before being marked stuck (scaled to the grid's cell size)
+        self.max_stuck_threshold = model.stuck_ticks   # will use more than n of steps for no landslide and 200 for activate areas
 
     def step(self):
         """
@@ -29,10 +32,11 @@ class Evacuee(Agent):
         if not self.alive or self.stuck or self.evacuated:
             return
 
-        if self.pos == self.model.safe_zone:
+        if self.model.is_exit(self.pos):
             if not self.evacuated:
                 self.model.reporter.record_evacuation_end(self)
                 self.evacuated = True
+                self.model.agents_finished("evacuated")
             return
 
         if not self.evacuation_started:
@@ -47,26 +51,14 @@ class Evacuee(Agent):
         self.previous_pos = self.pos
 
         moved_this_step = False
-        path = self.model.get_path(self.pos, self.model.safe_zone)
-
-        if path and len(path) > 1:
-            next_pos = path[1]
-
-            current_elev = self.model.get_elevation(self.pos)
-            next_elev = self.model.get_elevation(next_pos)
-            slope = next_elev - current_elev
-
-            uphill_factor = 2.45   # 0,58 m/s to non pwd
-            downhill_factor = 2.0  # universal — gives 0.67 m/s baseline (QU et al., 2014)
+        next_pos = self.model.get_next_cell(self.pos)
 
-            if slope > 0: slope_penalty = 1 + slope * uphill_factor
-            elif slope < 0: slope_penalty = 1 + abs(slope) * downhill_factor
-            else: slope_penalty = 1 # flat terrain
-            
-            effective_speed = self.model.base_speed * self.base_speed / slope_penalty
+        if next_pos is not None:
+            # slope penalty and effective speed are precomputed per move, see src/utils/slope.py
+            move_probability = self.model.get_move_probability(self.mobility_type, self.pos, next_pos)
 
             is_next_cell_building = self.model.obstacle_mask[next_pos[1], next_pos[0]]
-            passes_speed_check = self.model.random.random() < max(effective_speed, 0.75) # prob of moving never lower than 98%
+            passes_speed_check = self.model.random.random() < move_probability
 
             if not is_next_cell_building:
                 if passes_speed_check:
@@ -75,15 +67,17 @@ class Evacuee(Agent):
                         self.model.grid.move_agent(self, next_pos)
                         self.model.reporter.record_movement(self)
                         moved_this_step = True
-                        if next_pos == self.model.safe_zone:
+                        self.model.total_moves += 1
+                        if self.model.profiler is not None:
+                            self.model.profiler.count("moves")
+                        if self.model.is_exit(next_pos):
                             if not self.evacuated:
+                                self.model.exit_reached(next_pos)
                                 self.model.reporter.record_evacuation_end(self)
                                 self.evacuated = True
-                    else:
-                        from src.agents.landslide import Landslide
-                        contents = self.model.grid.get_cell_list_contents([next_pos])
-                        if any(isinstance(agent, Landslide) for agent in contents):
-                            reason_for_not_moving_is_landslide_block = True
+                                self.model.agents_finished("evacuated")
+                    elif self.model.profiler is not None:
+                        self.model.profiler.count("blocked_moves")
 
         if moved_this_step:
             self.stuck_counter = 0
@@ -92,6 +86,8 @@ class Evacuee(Agent):
 
         if not self.stuck and self.stuck_counter >= self.max_stuck_threshold:
             self.stuck = True
-            print(f'Agent {self.unique_id} at {self.pos} is now STUCK after {self.stuck_counter} attempts to move into a landslide (Threshold: {self.max_stuck_threshold}).')
+            self.model.agents_finished("stuck")
+            logger.debug('Agent %s at %s is now STUCK after %s attempts to move into a landslide (Threshold: %s).',
+                         self.unique_id, self.pos, self.stuck_counter, self.max_stuck_threshold)
             if hasattr(self.model.reporter, 'record_agent_stuck'):
                 self.model.reporter.record_agent_stuck(self)
\ No newline at end of file
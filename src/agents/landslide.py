@@ -1,21 +1,93 @@
+import numpy as np
 from mesa import Agent
-from src.agents.building import Building
 from src.agents.evacuee import Evacuee
+from src.model.grid import BUILDING, EMPTY
+from src.reporting.profiler import phase_timer
+from src.utils.landslide_timeline import NEVER, STRUCTURES, mask_window
+
 
 class Landslide(Agent):
-    def __init__(self, unique_id, model, mask, direction, cells_per_tick):
+    def __init__(self, unique_id, model, mask, direction, cells_per_tick, timeline=None):
         """
         :param cells_per_tick: fractional grid cells the landslide moves per tick
+        :param timeline: full-grid arrival layers of this wave from the scenario bundle
+                         (-1 = never, see src/utils/landslide_timeline.py), None: the front grows live
+                         from its neighbours every expansion (same run, slower)
         """
         super().__init__(unique_id, model)
         self.mask = mask
         self.direction = direction
+        self.offsets = STRUCTURES[direction]
         self.cells_per_tick = cells_per_tick
         self._accumulator = 0.0
-        self.front = []
-        self.visited = set()
+
+        # the wave can only ever touch its mask, so it works on the mask's bounding box,
+        # padded with one cell off the mask all around: cells are flat indices (row-major)
+        # into these arrays and the neighbour of cell in direction (dx, dy) is cell + delta
+        self.window = mask_window(mask)
+        self.origin = (self.window[1].start - 1, self.window[0].start - 1)   # grid (x, y) of padded cell 0
+        self.area = np.pad(np.asarray(mask[self.window], dtype=bool), 1)
+        width = self.area.shape[1]
+        self.deltas = np.array([dy * width + dx for dx, dy in self.offsets], dtype=np.int64)
+        self.front_mask = np.zeros(self.area.shape, dtype=bool)
+        self.visited = np.zeros(self.area.shape, dtype=bool)
+        self.front_cells = np.zeros(0, dtype=np.int64)   # the front, sorted flat indices
+        self.layer = 0   # expansions done, the front was taken in this one
+        self._timeline = timeline
+        self.arrival = None   # replayed timeline, set up by place_front if there is one
+
+    @property
+    def front(self):
+        """
+        front cells as (x, y) tuples
+        """
+        ys, xs = np.divmod(self.front_cells, self.area.shape[1])
+        x0, y0 = self.origin
+        return list(zip((xs + x0).tolist(), (ys + y0).tolist()))
+
+    def place_front(self, cells):
+        """
+        initial front: forced onto the grid whatever is there
+        """
+        x0, y0 = self.origin
+        old = self.front_mask.copy()
+        for pos in cells:
+            x, y = pos
+            self.front_mask[y - y0, x - x0] = True
+            self.force_place(pos)
+        self.front_cells = np.flatnonzero(self.front_mask)
+        self.model.move_landslide_front(self.window, old[1:-1, 1:-1], self.front_mask[1:-1, 1:-1])
+        if self._timeline is not None:
+            self._start_timeline()
+
+    def _start_timeline(self):
+        """
+        The wave replays its timeline: arrival[c] is the expansion it reaches
+        cell c in, source[c] the one c is taken in and spreads from (NEVER if
+        neither). Both start as on an empty grid; _correct keeps them exact
+        for whatever the live grid does. Cells are looked up per expansion
+        from the timeline sorted by arrival, plus the cells a repair moved
+        """
+        blocked = np.pad(np.asarray(self.model.obstacle_mask)[self.window], 1)
+        arrival = np.pad(np.asarray(self._timeline)[self.window], 1, constant_values=-1).ravel()
+        arrival = np.where(arrival < 0, NEVER, arrival).astype(np.int32)
+        self._timeline = None
+        base = self.front_mask.ravel()
+        # what an unvisited cell does once reached: spread, or stop the front (building, own base)
+        self.spreads = self.area.ravel() & ~blocked.ravel() & ~base
+        self.arrival = arrival
+        self.source = np.where(self.spreads, arrival, NEVER).astype(np.int32)
+        self.source[base] = 0
+        reached = np.flatnonzero(arrival != NEVER)
+        self._order = reached[np.argsort(arrival[reached], kind="stable")].astype(np.int32)
+        self._starts = np.searchsorted(arrival[self._order], np.arange(int(arrival[reached].max(initial=0)) + 2))
+        self._moved = {}   # expansion -> cells a repair moved to it
 
     def step(self):
+        with phase_timer(self.model.profiler, "landslides"):
+            self._spread()
+
+    def _spread(self):
         # add fractional progress
         self._accumulator += self.cells_per_tick
         expansions = int(self._accumulator)
@@ -23,44 +95,175 @@ class Landslide(Agent):
             return
         self._accumulator -= expansions
 
-        # expansions one cell at a time
+        # expansions one cell at a time, replayed from the timeline or grown live
+        old = front = self.front_cells
         for _ in range(expansions):
-            new_front = []
-            for (x, y) in self.front:
-                if self.direction == "up":
-                    candidates = [(x-1,y+1),(x,y+1),(x+1,y+1),(x-1,y),(x+1,y)]
-                for nx, ny in candidates:
-                    pos = (nx, ny)
-                    if self.model.grid.out_of_bounds(pos):
-                        continue
-                    # must be on a valid landslide mask cell
-                    if not self.mask[ny, nx]:
-                        continue
-                    if pos in self.visited:
-                        continue
-                    self.visited.add(pos)
-
-                    # interact with any agents/buildings at pos
-                    contents = self.model.grid.get_cell_list_contents([pos])
-                    from src.agents.evacuee import Evacuee
-                    for agent in contents:
-                        if isinstance(agent, Building):
-                            agent.buried = True
-                        elif isinstance(agent, Evacuee):
-                            agent.impacted_by_landslide = True
-                            agent.alive = False
-                            self.model.reporter.record_landslide_impact(agent)
-                            if agent.unique_id in self.model.schedule._agents:
-                                self.model.schedule.remove(agent)
-
-                    # place landslide cell
-                    if self.model.grid.is_cell_empty(pos, ignore_prohibited=True):
-                        self.force_place(pos)
-                        new_front.append(pos)
-
-            self.front = new_front
+            if not len(front):
+                break
+            layer = self.layer + 1
+            if self.arrival is None:
+                cells = np.unique(self._next(front))
+            else:
+                cells = self._reached(layer)
+            taken = self._expand(cells)
+            self.layer = layer
+            if self.arrival is not None:
+                self._correct(cells, taken, layer)
+            front = cells[taken]
+
+        self.front_cells = front
+        front_mask = self.front_mask.ravel()
+        front_mask[old] = False
+        front_mask[front] = True
+        x0, y0 = self.origin
+        width = self.area.shape[1]
+        old_ys, old_xs = np.divmod(old, width)
+        ys, xs = np.divmod(front, width)
+        self.model.move_landslide_cells(old_xs + x0, old_ys + y0, xs + x0, ys + y0)
+
+    def _reached(self, layer):
+        """
+        cells the expansion number layer reaches, sorted: the neighbours of the
+        front in the wave's direction, on its mask and not visited yet
+        """
+        parts = self._moved.pop(layer, [])
+        if layer + 1 < len(self._starts):
+            parts.append(self._order[self._starts[layer]:self._starts[layer + 1]])
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        cells = parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+        cells = cells.astype(np.int64)
+        return cells[(self.arrival[cells] == layer) & ~self.visited.ravel()[cells]]
+
+    def _correct(self, cells, taken, layer):
+        """
+        The timeline expected the cells it reached in this expansion to be
+        taken exactly where they spread (source == layer); the live grid can
+        differ: an evacuee or another wave's landslide on a cell stops the
+        front there, a safe zone on the own base lets it through. Then the
+        arrival of the cells downstream is re-derived from the live front
+        """
+        expected = self.source[cells] == layer
+        if np.array_equal(expected, taken):
+            return
+        lost, gained = cells[expected & ~taken], cells[~expected & taken]
+        self.source[lost] = NEVER
+        self.source[gained] = layer
+        self._repair(lost, gained, layer)
+
+    def _next(self, cells):
+        """
+        unvisited cells of the mask one move away from cells
+        """
+        nxt = (cells[:, None] + self.deltas).ravel()
+        return nxt[self.area.ravel()[nxt] & ~self.visited.ravel()[nxt]]
+
+    def _first_source(self, cells):
+        """
+        earliest expansion any cell one move before each of cells spreads in (NEVER if none)
+        """
+        return self.source[cells[:, None] - self.deltas].min(axis=1)
+
+    def _repair(self, lost, gained, layer):
+        """
+        Exact repair of arrival / source after the cells lost stopped spreading
+        and the cells gained started spreading in expansion layer. A cell is
+        reached one expansion after the earliest cell before it spreads.
+        1) the cells whose arrival relied on a lost cell lose it in turn, layer
+           by layer, unless another cell spreading one expansion earlier still
+           reaches them;
+        2) those cells and the ones after gained cells get their arrival again,
+           in order of expansion (unit-weight Dijkstra from the sources left),
+           moving on only as far as arrivals change.
+        Only unvisited cells change, the rest is history
+        """
+        arrival, source = self.arrival, self.source
+        invalid = []
+        check, at = self._next(lost), layer + 1
+        while len(check):
+            check = np.unique(check)
+            check = check[arrival[check] == at]
+            unsupported = check[self._first_source(check) != at - 1]
+            if not len(unsupported):
+                break
+            arrival[unsupported] = NEVER
+            spread = unsupported[source[unsupported] == at]
+            source[spread] = NEVER
+            invalid.append(unsupported)
+            check, at = self._next(spread), at + 1
+
+        pending = {}
+        if invalid:
+            cells = np.concatenate(invalid)
+            first = self._first_source(cells).astype(np.int64)
+            reached = first < NEVER
+            cells, at = cells[reached], (first[reached] + 1).astype(np.int32)
+            arrival[cells] = at
+            for a in np.unique(at).tolist():
+                pending.setdefault(a, []).append(cells[at == a])
+        if len(gained):
+            after = self._next(gained)
+            after = after[arrival[after] > layer + 1]
+            arrival[after] = layer + 1
+            pending.setdefault(layer + 1, []).append(after)
+
+        while pending:
+            at = min(pending)
+            cells = np.unique(np.concatenate(pending.pop(at)))
+            cells = cells[arrival[cells] == at]
+            if not len(cells):
+                continue
+            self._moved.setdefault(at, []).append(cells)
+            spread = cells[self.spreads[cells]]
+            source[spread] = at
+            after = self._next(spread)
+            after = after[arrival[after] > at + 1]
+            if len(after):
+                arrival[after] = at + 1
+                pending.setdefault(at + 1, []).append(after)
+
+    def _expand(self, cells):
+        """
+        the wave reaches cells: buildings get buried, evacuees standing there are hit,
+        and the landslide takes every empty one. Returns which ones it took
+        """
+        model, grid = self.model, self.model.grid
+        self.visited.ravel()[cells] = True
+        x0, y0 = self.origin
+        ys, xs = np.divmod(cells, self.area.shape[1])
+        ys, xs = ys + y0, xs + x0
+        occupancy = grid.occupancy[ys, xs]
+        # safe zones always count as empty, and whoever made it there is safe
+        at_safe_zone = model.exit_mask[ys, xs]
+        empty = (occupancy == EMPTY) | at_safe_zone
+
+        buried = occupancy == BUILDING
+        grid.buried[ys[buried], xs[buried]] = True
+        if model.profiler is not None:
+            model.profiler.count("landslide_cells", len(cells))
+            model.profiler.count("buildings_buried", int(buried.sum()))
+        hit = (occupancy >= 0) & ~at_safe_zone
+        if model.crowd is not None:
+            model.crowd.hit_by_landslide(model, xs[hit], ys[hit])
+        else:
+            self._hit(grid.agents_at(xs[hit], ys[hit]))
+
+        # place landslide cells
+        grid.force_place_many(self, xs[empty], ys[empty])
+        return empty
+
+    def _hit(self, agents):
+        """
+        evacuees overrun by the wave (mesa engine)
+        """
+        for agent in agents:
+            if isinstance(agent, Evacuee):
+                self.model.agents_finished("impacted", active=int(not (agent.stuck or agent.evacuated)))
+                agent.impacted_by_landslide = True
+                agent.alive = False
+                self.model.reporter.record_landslide_impact(agent)
+                if agent.unique_id in self.model.schedule._agents:
+                    self.model.schedule.remove(agent)
 
     def force_place(self, pos):
-        x, y = pos
-        self.pos = pos
-        self.model.grid._grid[x][y] = self
+        self.model.grid.force_place(self, pos)
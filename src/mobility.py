@@ -15,4 +15,7 @@ class MobilityType(Enum):
 
     @property
     def value(self):
-        return (self.color, self.speed)
\ No newline at end of file
+        return (self.color, self.speed)
+
+# fixed order, used to index per-mobility arrays (move probabilities, the array engine)
+MOBILITY_TYPES = list(MobilityType)
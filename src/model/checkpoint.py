@@ -0,0 +1,67 @@
+# src/model/checkpoint.py
+"""
+Snapshots of a running EvacuationModel: agents, grid occupancy, landslide
+fronts and visited cells, routing field, reporter and the random state,
+pickled and compressed. The static layers are not in them, restore() maps
+the cached scenario bundle again, so a snapshot of the native grid is a few
+hundred kB.
+
+A restored model goes on exactly as the original would have. fork() does
+the same with another seed and / or parameters (EvacuationModel.FORKABLE),
+so many what-if runs share one simulated opening phase:
+
+    model.run_until_done(max_steps=92)      # ~minute 1 on the native grid
+    data = snapshot(model)
+    forks = [fork(data, seed=s, run_id=i) for i, s in enumerate(seeds)]
+
+Reports saved before the snapshot (e.g. minute_1) are not written again by
+the restored models.
+"""
+import pickle
+import zlib
+from pathlib import Path
+from src.utils.scenario import load_scenario
+
+SNAPSHOT_VERSION = 2
+
+
+def snapshot(model):
+    """
+    the compressed state of model, as bytes
+    """
+    return zlib.compress(pickle.dumps((SNAPSHOT_VERSION, model), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def restore(data, scenario=None):
+    """
+    the model of a snapshot, on scenario (default: the cached bundle of its grid size)
+    """
+    version, model = pickle.loads(zlib.decompress(data))
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot version {version}, expected {SNAPSHOT_VERSION}")
+    model.attach_scenario(load_scenario(model.width, model.height) if scenario is None else scenario)
+    return model
+
+
+def fork(data, seed=None, scenario=None, **params):
+    """
+    a restored model drawing from seed (None: the snapshot's own random state)
+    with params changed, see EvacuationModel.set_parameters
+    """
+    model = restore(data, scenario)
+    if seed is not None:
+        model.reseed(seed)
+    if params:
+        model.set_parameters(**params)
+    return model
+
+
+def save_checkpoint(model, path):
+    """
+    writes the snapshot of model to path
+    """
+    Path(path).write_bytes(snapshot(model))
+
+
+def load_checkpoint(path, scenario=None):
+    return restore(Path(path).read_bytes(), scenario)
@@ -0,0 +1,200 @@
+import logging
+import numpy as np
+from src.mobility import MOBILITY_TYPES
+from src.model.grid import EMPTY
+from src.utils.slope import direction_index
+
+logger = logging.getLogger(__name__)
+
+
+class Crowd:
+    """
+    Array engine: every evacuee as one row of a structure of arrays.
+    step() reproduces Evacuee.step for the whole population at once (same
+    routing, move probabilities, draws from model.random, reports and stuck
+    rule); moves are resolved exactly as the sequential schedule would,
+    lower index first, with vacated cells usable by higher indices only.
+    Evacuee i occupies grid slot i.
+    With rng set (the "batched" engine) the speed checks are drawn in one call
+    from that numpy Generator instead of one model.random call per agent:
+    much faster on large crowds, but no longer the mesa engine's random stream.
+    """
+    def __init__(self, n, max_stuck_threshold=40):
+        self.n = n
+        self.max_stuck_threshold = max_stuck_threshold
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n, dtype=np.int64)
+        self.mobility = np.zeros(n, dtype=np.int8)    # index in MOBILITY_TYPES
+        self.started = np.zeros(n, dtype=bool)
+        self.evacuated = np.zeros(n, dtype=bool)
+        self.impacted = np.zeros(n, dtype=bool)
+        self.stuck = np.zeros(n, dtype=bool)
+        self.stuck_counter = np.zeros(n, dtype=np.int64)
+        self.row = np.full(n, -1, dtype=np.int64)      # reporter row, -1 until started
+        self.rng = None   # numpy Generator for batched speed draws, None: draw from model.random
+
+    def place(self, mobility, xs, ys):
+        """
+        every evacuee at once: MOBILITY_TYPES indices and start cells
+        """
+        self.mobility[:] = mobility
+        self.x[:], self.y[:] = xs, ys
+
+    @property
+    def done(self):
+        return self.evacuated | self.impacted | self.stuck
+
+    def hit_by_landslide(self, model, xs, ys):
+        """
+        evacuees standing on the given cells are impacted (called by Landslide.step)
+        """
+        slots = model.grid.occupancy[ys, xs]
+        hit = slots[(slots >= 0) & (slots < self.n)]
+        if len(hit) == 0:
+            return
+        model.agents_finished("impacted", len(hit), active=int((~self.done[hit]).sum()))
+        self.impacted[hit] = True
+        rows = self.row[hit]
+        started = rows >= 0
+        model.reporter.record_landslide_impacts(rows[started], self.x[hit][started], self.y[hit][started])
+
+    def step(self, model):
+        reporter = model.reporter
+        width = model.width
+        exit_index = model.exit_index.ravel()
+        occupancy = model.grid.occupancy.ravel()
+
+        active = np.flatnonzero(~(self.impacted | self.stuck | self.evacuated))
+        pos = self.y[active] * width + self.x[active]
+
+        # already on a safe zone: just finish
+        arrived = exit_index[pos] >= 0
+        if arrived.any():
+            done = active[arrived]
+            self.evacuated[done] = True
+            model.agents_finished("evacuated", len(done))
+            reporter.record_evacuation_ends(self.row[done], self.x[done], self.y[done])
+            active, pos = active[~arrived], pos[~arrived]
+
+        # first step: start tracking (rows in index order, like the schedule)
+        new = active[~self.started[active]]
+        if len(new):
+            names = [MOBILITY_TYPES[m].name for m in self.mobility[new].tolist()]
+            self.row[new] = reporter.record_evacuation_starts(new, names, self.x[new], self.y[new])
+            self.started[new] = True
+
+        # batched next hop from the shared routing field
+        nxt = model.router.next_hop.ravel()[pos]
+        has_next = nxt >= 0
+        movers, src, tgt = active[has_next], pos[has_next], nxt[has_next]
+
+        # move probabilities (slope included) from the model's precomputed table
+        k = direction_index(tgt % width - src % width, tgt // width - src // width)
+        probability = model.move_prob[self.mobility[movers], src // width, src % width, k]
+
+        # one draw per agent with a next cell, in schedule order, as Evacuee.step does
+        if self.rng is not None:
+            draws = self.rng.random(len(movers))
+        else:
+            rand = model.random.random
+            draws = np.array([rand() for _ in range(len(movers))])
+        passes = draws < probability
+        wants = passes & ~np.asarray(model.obstacle_mask).ravel()[tgt]
+        movers, src, tgt = movers[wants], src[wants], tgt[wants]
+
+        moved = self._resolve(model, active, pos, movers, tgt, occupancy)
+        if model.profiler is not None:
+            model.profiler.count("moves", int(moved.sum()))
+            model.profiler.count("blocked_moves", int((~moved).sum()))
+        movers, src, tgt = movers[moved], src[moved], tgt[moved]
+        model.total_moves += len(movers)
+
+        # apply moves: vacate every source first, then fill targets
+        occupancy[src] = EMPTY
+        occupancy[tgt] = movers
+        self.x[movers], self.y[movers] = tgt % width, tgt // width
+        reporter.record_movements(self.row[movers], self.x[movers], self.y[movers])
+
+        reached = exit_index[tgt] >= 0
+        if reached.any():
+            done = movers[reached]
+            model.exits_reached(self.x[done], self.y[done])
+            self.evacuated[done] = True
+            model.agents_finished("evacuated", len(done))
+            reporter.record_evacuation_ends(self.row[done], self.x[done], self.y[done])
+
+        # stuck rule: consecutive ticks without moving
+        still = np.ones(len(active), dtype=bool)
+        still[np.searchsorted(active, movers)] = False
+        self.stuck_counter[active[~still]] = 0
+        self.stuck_counter[active[still]] += 1
+        newly_stuck = active[still & (self.stuck_counter[active] >= self.max_stuck_threshold)]
+        if len(newly_stuck):
+            self.stuck[newly_stuck] = True
+            model.agents_finished("stuck", len(newly_stuck))
+            if logger.isEnabledFor(logging.DEBUG):
+                for i in newly_stuck.tolist():
+                    logger.debug('Agent %s at %s is now STUCK after %s attempts to move into a landslide (Threshold: %s).',
+                                 i, (int(self.x[i]), int(self.y[i])), self.stuck_counter[i], self.max_stuck_threshold)
+            reporter.record_agents_stuck(self.row[newly_stuck], self.x[newly_stuck], self.y[newly_stuck])
+
+    def _resolve(self, model, active, pos, movers, tgt, occupancy):
+        """
+        Which movers get their target cell, with the outcome the sequential
+        schedule would give. A cell taken by agent k frees up when k moves
+        out, and then only for agents after k; the first eligible agent wins.
+        Agents only ever wait on lower indices, so this settles in a few rounds.
+        An open exit takes the first agents heading to it up to its remaining capacity.
+        """
+        m = len(movers)
+        success = np.zeros(m, dtype=bool)
+        decided = np.zeros(m, dtype=bool)
+        if m == 0:
+            return success
+
+        # who stands where at the start of the tick (active agents only)
+        who = np.full(occupancy.shape, -1, dtype=np.int64)
+        who[pos] = active
+        mover_of = np.full(self.n, -1, dtype=np.int64)
+        mover_of[movers] = np.arange(m)
+
+        walkable = model.walkable.ravel()
+        exit_of = model.exit_index.ravel()[tgt]
+        to_safe = exit_of >= 0
+        if to_safe.any():
+            # rank of each mover among those heading to the same exit (movers are in index order)
+            idx = np.flatnonzero(to_safe)
+            order = idx[np.argsort(exit_of[idx], kind="stable")]
+            exits = exit_of[order]
+            first = np.r_[0, np.flatnonzero(exits[1:] != exits[:-1]) + 1]
+            rank = np.arange(len(order)) - np.repeat(first, np.diff(np.r_[first, len(order)]))
+            left = model.exit_capacity - model.exit_arrivals
+            success[order] = rank < left[exits]
+            decided[to_safe] = True
+        blocked = ~to_safe & ~walkable[tgt]   # prohibited (buildings were never targets)
+        decided[blocked] = True
+
+        occupant = who[tgt]
+        occupant_mover = np.where(occupant >= 0, mover_of[np.maximum(occupant, 0)], -1)
+        # occupied by something that will not leave (landslide, building, standing agent)
+        stays = ~decided & (((occupant < 0) & (occupancy[tgt] != EMPTY)) | ((occupant >= 0) & (occupant_mover < 0)))
+        # occupant leaves only after this agent's turn
+        later = ~decided & (occupant >= 0) & (occupant > movers)
+        decided[stays | later] = True
+
+        while not decided.all():
+            # release time of each target cell: -1 free, k if its occupant k moved out, inf otherwise
+            free = (occupant < 0) & (occupancy[tgt] == EMPTY)
+            known = ~decided & (free | ((occupant_mover >= 0) & decided[np.maximum(occupant_mover, 0)]))
+            release = np.where(free, -1, np.where(success[np.maximum(occupant_mover, 0)], occupant, self.n))
+            idx = np.flatnonzero(known)
+            eligible = idx[movers[idx] > release[idx]]
+            decided[idx] = True
+            if len(eligible):
+                # first eligible agent per cell wins
+                order = np.lexsort((movers[eligible], tgt[eligible]))
+                cells = tgt[eligible][order]
+                first = np.ones(len(order), dtype=bool)
+                first[1:] = cells[1:] != cells[:-1]
+                success[eligible[order][first]] = True
+        return success
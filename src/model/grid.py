@@ -0,0 +1,136 @@
+import numpy as np
+
+EMPTY = -1
+BUILDING = -2
+
+
+class PartialMultiGrid:
+    """
+    Single-occupancy grid stored as arrays.
+    occupancy[y, x] holds the slot of the agent in the cell, EMPTY, or
+    BUILDING for static obstacles, which are plain data (no agent objects).
+    walkable[y, x] is the static part of it: not a building, not prohibited.
+    Emptiness checks are a single array lookup.
+    """
+    def __init__(self, width, height, torus=False, obstacles=None, prohibited=None):
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.num_cells = width * height
+
+        self.occupancy = np.full((height, width), EMPTY, dtype=np.int32)
+        self.static_obstacles = np.zeros((height, width), dtype=bool)
+        self.buried = np.zeros((height, width), dtype=bool)  # buildings reached by a landslide
+        if obstacles is not None:
+            self.static_obstacles[:] = obstacles
+            self.occupancy[self.static_obstacles] = BUILDING
+        self.walkable = ~self.static_obstacles
+        if prohibited is not None:
+            self.walkable &= ~np.asarray(prohibited, dtype=bool)
+
+        self._agents = []   # slot -> agent
+        self._slots = {}    # unique_id -> slot
+
+    def _slot(self, agent):
+        slot = self._slots.get(agent.unique_id)
+        if slot is None:
+            slot = len(self._agents)
+            self._slots[agent.unique_id] = slot
+            self._agents.append(agent)
+        return slot
+
+    @property
+    def num_slots(self):
+        return len(self._agents)
+
+    def slot_of(self, agent):
+        return self._slots[agent.unique_id]
+
+    def reserve_slots(self, n):
+        """
+        keeps slots 0..n-1 for agents that are not objects (the array engine's crowd)
+        """
+        self._agents.extend([None] * n)
+
+    def out_of_bounds(self, pos):
+        x, y = pos
+        return x < 0 or x >= self.width or y < 0 or y >= self.height
+
+    def is_cell_empty(self, pos, ignore_prohibited=False):
+        """
+        A safe zone is empty while it is open (it takes any number of agents
+        until its capacity is reached), a full one never is.
+        Also, never allow prohibited cells.
+        """
+        x, y = pos
+        # safe zones
+        if self.model.exit_mask[y, x]:
+            return bool(self.model.open_exit_mask[y, x])
+
+        # prohibited cells (a triangle)
+        if not ignore_prohibited and not self.walkable[y, x]:
+            return False
+
+        # normal cells
+        return self.occupancy[y, x] == EMPTY
+
+    def is_building(self, pos):
+        x, y = pos
+        return self.occupancy[y, x] == BUILDING
+
+    def place_agent(self, agent, pos):
+        if not self.is_cell_empty(pos):
+            raise Exception("Cell not empty")
+        self.force_place(agent, pos)
+
+    def force_place(self, agent, pos):
+        """
+        puts agent at pos whatever is there (landslides overrun cells)
+        """
+        x, y = pos
+        self.occupancy[y, x] = self._slot(agent)
+        agent.pos = pos
+
+    def force_place_many(self, agent, xs, ys):
+        """
+        force_place for a whole array of cells (a landslide front)
+        """
+        if len(xs) == 0:
+            return
+        self.occupancy[ys, xs] = self._slot(agent)
+        agent.pos = (int(xs[-1]), int(ys[-1]))
+
+    def agents_at(self, xs, ys):
+        """
+        agents standing on the given cells (buildings and empty cells give nothing)
+        """
+        slots = self.occupancy[ys, xs]
+        return [self._agents[slot] for slot in slots[slots >= 0].tolist()]
+
+    def remove_agent(self, agent):
+        if (pos := agent.pos) is None:
+            return
+        x, y = pos
+        self.occupancy[y, x] = EMPTY
+        agent.pos = None
+
+    def move_agent(self, agent, pos):
+        self.remove_agent(agent)
+        self.place_agent(agent, pos)
+
+    def iter_cell_list_contents(self, cell_list):
+        """
+        agents in the given cells; empty cells (including open safe zones) and buildings give nothing
+        """
+        if isinstance(cell_list, tuple) and len(cell_list) == 2:
+            cell_list = [cell_list]
+        for pos in cell_list:
+            if self.is_cell_empty(pos):
+                continue
+            x, y = pos
+            slot = self.occupancy[y, x]
+            if slot >= 0:
+                yield self._agents[slot]
+
+    def get_cell_list_contents(self, cell_list):
+        return list(self.iter_cell_list_contents(cell_list))
@@ -1,34 +1,26 @@
-import random
+import logging
+import time
+from pathlib import Path
 import numpy as np
-from scipy.ndimage import label
-from tornado.ioloop import IOLoop
 from mesa import Model
-from mesa.space import SingleGrid
 from mesa.time import SimultaneousActivation
 from src.agents.evacuee import Evacuee
-from src.agents.building import Building
 from src.agents.landslide import Landslide
-from src.mobility import MobilityType
+from src.mobility import MOBILITY_TYPES, MobilityType
+from src.model.crowd import Crowd
+from src.model.grid import EMPTY, PartialMultiGrid
 from src.reporting.manager import ReportManager
-from src.utils.pathfinding import a_star_path, load_elevation, load_paths
-
-class PartialMultiGrid(SingleGrid):
-    def is_cell_empty(self, pos, ignore_prohibited=False):
-        """
-        If position is the safe zone, it will be treated like its empty (unlimited capacity).
-        Also, never allow prohibited cells.
-        """
-        # always allow safe zone
-        if pos == self.model.safe_zone:
-            return True
-        
-        # prohibited cells (a triangle)
-        if not ignore_prohibited and pos in getattr(self.model, "prohibited", ()):
-            return False
-        
-        # normal cells
-        return super().is_cell_empty(pos)
-
+from src.reporting.profiler import TickProfiler, phase_timer
+from src.reporting.trajectory import TrajectoryRecorder
+from src.utils.congestion import congestion_cost, crowd_density
+from src.utils.incremental_field import IncrementalDistanceField
+from src.utils.landslide_timeline import wave_fronts
+from src.utils.pathfinding import a_star_path
+from src.utils.scenario import NATIVE_HEIGHT, NATIVE_WIDTH, GridConfig, load_scenario
+from src.utils.slope import (DIRECTIONS, DOWNHILL_FACTOR, UPHILL_FACTOR, expected_ticks,
+                             move_probabilities, slope_penalties)
+
+logger = logging.getLogger(__name__)
 
 class EvacuationModel(Model):
     def __init__(
@@ -38,114 +30,178 @@ class EvacuationModel(Model):
         num_agents=20,
         pwd_ratio=0.089, # data from IBGE
         active_areas=None,
-        enable_landslide=True
+        enable_landslide=True,
+        seed=None,      # picked up by mesa.Model.__new__ to seed self.random
+        run_id=None,    # tags the report files of this run (batch runs)
+        on_finish=None, # called with the model once the run terminates
+        trajectory_path=None, # opt-in: stream every tick to this directory, see src/reporting/trajectory.py
+        engine="mesa",  # "mesa": one Evacuee agent each, "array": the whole crowd as arrays (src/model/crowd.py),
+                        # "batched": "array" with numpy speed draws (faster, not the mesa random stream)
+        routing_mobility=None, # None: routes ignore terrain; a MobilityType: moves weighted by its expected ticks on the slope
+        safe_zones=None, # shelters as [(x, y, capacity), ...], capacity None = unlimited; default one unlimited at (0, height-1)
+        congestion_weight=0.0, # > 0: crowded cells cost more to route through (1 + weight * local density)
+        routing_interval=1,    # ticks between congestion refreshes of the routing field
+        profile=False,         # opt-in per-tick phase timers and counters, saved next to the final report
+        scenario=None,         # preloaded static layers (src/utils/scenario.py), default: the cached bundle for width x height
+        reports_dir="reports/no_landslide", # where the csv reports (and profiles) go
+        steady_ticks=10,       # quiet ticks before checking for a steady state to fast-forward (None = never)
+        landslide_speed=5.25,  # calibration speed of the landslide fronts, see _set_landslide_speed
+        uphill_factor=UPHILL_FACTOR,     # slope penalty per unit of rise / fall, see src/utils/slope.py
+        downhill_factor=DOWNHILL_FACTOR,
+        mobility_speeds=None,  # {MobilityType or its name: relative speed}, overrides the MobilityType speeds
+        max_stuck_threshold=40, # ticks (on the native grid) an evacuee tries to move before being marked stuck, see _set_stuck_threshold
         ): 
         super().__init__()
 
         self.enable_landslide = enable_landslide
-
-        # grid and schedule initialization
-        self.grid = PartialMultiGrid(width, height, torus=False) # creates the simulation space / single for one agent per cell
-        self.grid.model = self # Attach the model instance so that safe_zone is accessible
-
-        # env setup
-        self.safe_zone = (0, height - 1)
-        self.terrain = load_elevation(width, height) # TODO: load elevation info
+        self.run_id = run_id
+        self.on_finish = on_finish
+        self.profiler = TickProfiler() if profile else None
+        if engine not in ("mesa", "array", "batched"):
+            raise ValueError(f"unknown engine {engine!r}")
+        self.engine = engine
+
+        # env setup: every static layer comes from the cached, memory-mapped scenario bundle
+        self.scenario = load_scenario(width, height) if scenario is None else scenario
+        if (self.scenario.width, self.scenario.height) != (width, height):
+            raise ValueError(f"scenario is {self.scenario.width}x{self.scenario.height}, not {width}x{height}")
+        self.terrain = self.scenario.terrain
+        self.grid_config = self.scenario.config   # cell size in metres, from the raster bounds
         self.width  = width    # 220
         self.height = height   # 180
 
-        raw_mask = np.load("data/processed/obstacle_mask.npy")
-        self.obstacle_mask = np.flipud(raw_mask)
-
-        uid = 10_000     # numbers above any evacuee id
-        for y in range(height):
-            for x in range(width):
-                if self.obstacle_mask[y, x]:
-                    b = Building(f"b{y}_{x}", (x, y), self)
-                    uid += 1
-                    self.grid.place_agent(b, (x, y)) # buildings are never scheduled
-
-        # adding 'prohibited' cells (actually, they are hills and agents wouldnt be there in a normal situation)
-        leg_left = 70 # length of the edges that will build the triangle
-        leg_right = 50
-        self.prohibited = {
-            (x, y)
-            for x in range(self.width)
-            for y in range(self.height)
-            if (x + y < leg_left)                      # bottom‐left
-                or ((self.width - 1 - x) + y < leg_right)    # bottom‐right
-        }
+        self.obstacle_mask = self.scenario.obstacle_mask
+
+        # shelters (exits): an open exit takes any number of evacuees until its capacity is reached,
+        # then it closes and the routing field sends everyone to the nearest exit still open
+        if safe_zones is None:
+            safe_zones = [(0, height - 1, None)]
+        self.exits = [(int(x), int(y)) for x, y, _ in safe_zones]
+        self.exit_capacity = np.array([np.inf if c is None else c for _, _, c in safe_zones], dtype=np.float64)
+        self.exit_arrivals = np.zeros(len(self.exits), dtype=np.int64)
+        self.exit_index = np.full((height, width), -1, dtype=np.int32)   # exit number of each cell, -1 if none
+        for e, (x, y) in enumerate(self.exits):
+            if not (0 <= x < width and 0 <= y < height):
+                raise ValueError(f"safe zone {(x, y)} is off the grid")
+            if self.exit_index[y, x] >= 0 or self.obstacle_mask[y, x]:
+                raise ValueError(f"safe zone {(x, y)} is a duplicate or inside a building")
+            self.exit_index[y, x] = e
+        self.exit_mask = self.exit_index >= 0
+        self.open_exit_mask = self.exit_mask.copy()
+        self.open_exit_mask[self.exit_mask] = self.exit_capacity > 0
+        self.safe_zone = self.exits[0]  # the first exit, for single-exit callers
+
+        # grid and schedule initialization
+        # buildings are plain data in the grid's occupancy arrays, not agents
+        # 'prohibited' cells (actually, they are hills and agents wouldnt be there in a normal situation):
+        # two triangles, bottom-left and bottom-right, see src/utils/scenario.py
+        self.grid = PartialMultiGrid(width, height, torus=False, obstacles=self.obstacle_mask,
+                                     prohibited=self.scenario.prohibited) # creates the simulation space / single for one agent per cell
+        self.grid.model = self # Attach the model instance so that safe_zone is accessible
+        self.walkable = self.grid.walkable   # static: not a building, not prohibited
 
         # ─── timing parameters
-        self.step_length = 1.0              # meters per grid‐move/step
+        self.step_length = self.grid_config.cell_size   # meters per grid‐move/step (~0.98 on 220x180)
         self.target_time = 10 * 60          # total real‐world seconds = 600 s
 
         # base speeds (m/s)
         self.base_speed     = 1.5               # your emergency flat speed
 
-        # compute the real‐world seconds each PWD tick would take (slowest agent)
-        dt_list = [
-            self.step_length / (self.base_speed * mt.speed)
-            for mt in MobilityType
-        ]
-        # pick the slowest (largest dt) so no one overshoots the clock
-        self.dt = max(dt_list)            # seconds per tick (a call to step())
-
         self.time_per_step = (self.step_length / self.base_speed)
 
+        # relative speed of each mobility type (MOBILITY_TYPES order) and the slope factors
+        # give the move probabilities, see _update_movement
+        self.mobility_speeds = self._speeds(mobility_speeds)
+        self.uphill_factor = uphill_factor
+        self.downhill_factor = downhill_factor
+        self.routing_mobility = routing_mobility
+        self._update_movement()
+
         # how many ticks until 600 s have elapsed?
         self.max_steps = int(self.target_time / self.time_per_step)
 
-        print(f'max steps: {self.max_steps}')
+        logger.info(f'max steps: {self.max_steps}')
 
         # step counter
         self.current_step = 0
         self.schedule = SimultaneousActivation(self) # prepares the schedule: who moves and when (agents)
         self.running = True # control flag (mesa)
 
-        shapefile_path = "data/raw/Caminho.shp"
-        self.path_mask = load_paths(width, height, shapefile_path)
-
-        # reporting system
-        self.reporter = ReportManager(self)
-
+        self.path_mask = self.scenario.path_mask
+        self.router = None  # built on the first step, see step()
+
+        # bumped whenever the blocked cells (landslide fronts, full shelters) really change:
+        # the routing field is only touched on a new version
+        self.mask_version = 0
+        self._router_version = None
+        self.field_reuses = 0    # ticks the routing field was reused as is
+        self.field_updates = 0   # ticks it had to be built or repaired
+
+        # live outcome counters, kept up to date on every state transition (see agents_finished)
+        self.agent_counts = {"active": num_agents, "evacuated": 0, "impacted": 0, "stuck": 0}
+        self.total_moves = 0
+
+        # steady state: after steady_ticks ticks in a row without moves, landslide growth or
+        # blocked cell changes, a run where nobody can move anymore jumps to its end
+        self.steady_ticks = steady_ticks
+        self.quiet_ticks = 0
+        self.fast_forwarded = 0   # ticks skipped that way
+
+        # congestion-aware routing: the field's cell costs follow the smoothed crowd density,
+        # refreshed every routing_interval ticks (obstacles are still repaired every tick)
+        self.num_agents = num_agents
+        self._set_stuck_threshold(max_stuck_threshold)
+        self.congestion_weight = congestion_weight
+        self.routing_interval = routing_interval
+        self._base_cost = np.where(np.asarray(self.path_mask).ravel(), 1.0, 2.0)
+
+        # every evacuee / landslide wave ever created (the schedule drops impacted agents)
+        self.evacuees = []
+        self.landslides = []
+
+        # array engine: evacuees live in the crowd arrays (not in the schedule),
+        # evacuee i keeps grid slot i so landslide slots start after them
+        self.crowd = None
+        if engine in ("array", "batched"):
+            self.crowd = Crowd(num_agents, self.stuck_ticks)
+            self.grid.reserve_slots(num_agents)
+
+        # running mask of the cells blocked by landslide fronts, kept up to date by
+        # the waves themselves (fronts of different waves may overlap, hence the count)
+        self.landslide_block = np.zeros((height, width), dtype=bool)
+        self._landslide_front_count = np.zeros((height, width), dtype=np.int16)
+
+        # mobility types and start cells for everyone in one go: pwd at pwd_ratio, then
+        # distinct walkable cells (not a building, prohibited or safe zone) sampled without replacement,
+        # drawn from a numpy generator seeded off self.random so seeded runs stay reproducible
+        rng = np.random.default_rng(self.random.getrandbits(64))
         pwd_types = [MobilityType.MOTOR, MobilityType.VISUAL, MobilityType.INTELLECTUAL]
-
-        for i in range(num_agents):
-            # if they are pwd, place them randomly, add to the grid and schedule
-            if self.random.random() < pwd_ratio:
-                mobility = self.random.choice(pwd_types)
-            else:
-                mobility = MobilityType.NON_PWD
-
-            # agent creation code
-            while True:
-                x, y = self.random.randrange(width), self.random.randrange(height)
-
-                if (x, y) == self.safe_zone:            # not the safe zone
-                    continue
-                if self.obstacle_mask[y, x]:            # not inside building
-                    continue
-                if (x, y) in self.prohibited:
-                    continue
-                if not self.grid.is_cell_empty((x, y)): # not occupied
-                    continue
-                break
-            
-            agent = Evacuee(i, self, mobility_type=mobility)
-            self.grid.place_agent(agent, (x, y))
-            self.schedule.add(agent)
+        pwd_index = np.array([MOBILITY_TYPES.index(mt) for mt in pwd_types], dtype=np.int8)
+        mobility = np.full(num_agents, MOBILITY_TYPES.index(MobilityType.NON_PWD), dtype=np.int8)
+        pwd = rng.random(num_agents) < pwd_ratio
+        mobility[pwd] = pwd_index[rng.integers(len(pwd_index), size=int(pwd.sum()))]
+
+        candidates = np.flatnonzero(self.walkable & ~self.exit_mask)
+        if num_agents > len(candidates):
+            raise ValueError(f"{num_agents} agents do not fit in {len(candidates)} walkable cells")
+        cells = rng.choice(candidates, size=num_agents, replace=False)
+        xs, ys = cells % width, cells // width
+
+        if self.crowd is not None:
+            self.crowd.place(mobility, xs, ys)
+            self.grid.occupancy[ys, xs] = np.arange(num_agents)
+            if engine == "batched":
+                self.crowd.rng = rng   # same placement as the other engines, then the speed draws
+        else:
+            for i, (m, x, y) in enumerate(zip(mobility.tolist(), xs.tolist(), ys.tolist())):
+                agent = Evacuee(i, self, mobility_type=MOBILITY_TYPES[m])
+                self.grid.place_agent(agent, (x, y))
+                self.schedule.add(agent)
+                self.evacuees.append(agent)
 
         # landslide configs
         if self.enable_landslide:
-            mask_files = [
-                "data/processed/landslide_mask_1.npy",
-                "data/processed/landslide_mask_2.npy",
-                "data/processed/landslide_mask_3.npy",
-            ]
-            self.landslide_masks = [
-                np.flipud(np.load(fp)) for fp in mask_files
-            ]
+            self.landslide_masks = list(self.scenario.landslide_masks)
             # if user didnt specify activate all
             self.active_areas = (
                 active_areas
@@ -154,45 +210,37 @@ class EvacuationModel(Model):
             )
 
             # landslide timing / velocity
-            self.landslide_speed         = 5.25  # m/s  
-            self.ls_cells_per_tick = (
-                self.landslide_speed * self.base_speed
-                / self.step_length
-            )
+            self._set_landslide_speed(landslide_speed)
 
             self.impacted_by_landslide = False
 
-            lid = 10000
+            # every wave replays its timeline from the scenario bundle, see src/utils/landslide_timeline.py
             for idx, mask in enumerate(self.landslide_masks):
                 if idx not in self.active_areas:
                     continue
-                # label components inside this shapefile (usually 1, but safe)
-                labeled, n_comp = label(mask)
-                for comp in range(1, n_comp+1):
-                    coords = np.argwhere(labeled == comp)
-                    base_row = coords[:,0].min()
-                    base_front = [
-                        (col, base_row) for (row,col) in coords
-                        if row == base_row
-                    ]
+                # one wave per component inside this shapefile (usually 1, but safe)
+                timelines = np.flatnonzero(self.scenario.landslide_wave_area == idx)
+                for comp, (base_front, w) in enumerate(zip(wave_fronts(mask), timelines), start=1):
                     wave = Landslide(
                         unique_id=f"ls_{idx}_{comp}",
                         model=self,
                         mask=self.landslide_masks[idx],
                         direction="up",
-                        cells_per_tick=self.ls_cells_per_tick
+                        cells_per_tick=self.ls_cells_per_tick,
+                        timeline=self.scenario.landslide_arrival[w],
                     )
-                    wave.front = base_front
-                    for pos in base_front:
-                        wave.force_place(pos)
+                    wave.place_front(base_front)
                     self.schedule.add(wave)
-                    lid += 1
+                    self.landslides.append(wave)
         else:
             self.landslide_masks = []
             self.active_areas = []
 
-        # reporting system 
-        self.reporter = ReportManager(self)
+        # blocked cells as of the last routing update (see _update_router), also read by get_path
+        self.current_step_combined_obstacle_mask = self._combined_obstacle_mask()
+
+        # reporting system
+        self.reporter = ReportManager(self, reports_dir)
 
         # thresholds (in seconds) at which to auto-save intermediate reports
         self._report_thresholds = {
@@ -202,21 +250,165 @@ class EvacuationModel(Model):
         }
         self._reports_saved = set()   # to avoid duplicates
 
+        self.trajectory = None
+        if trajectory_path is not None:
+            self.trajectory = TrajectoryRecorder(trajectory_path)
+            self.trajectory.record(self)  # tick 0, initial positions
+
+    @staticmethod
+    def _speeds(mobility_speeds):
+        """
+        {MobilityType or its name: speed} overrides -> speed of every mobility type
+        """
+        overrides = {MobilityType[k] if isinstance(k, str) else k: v for k, v in (mobility_speeds or {}).items()}
+        return np.array([float(overrides.get(mt, mt.speed)) for mt in MOBILITY_TYPES])
+
+    def _update_movement(self):
+        """
+        what follows from the speeds and slope factors on the static terrain: chance of
+        passing the speed check for every mobility type, cell and direction,
+        move_prob[MOBILITY_TYPES index, y, x, MOORE_OFFSETS index], and the routing weights
+        (the bundle's slope penalties use the default factors, other factors are recomputed)
+        """
+        # compute the real‐world seconds each PWD tick would take (slowest agent)
+        dt_list = [
+            self.step_length / (self.base_speed * speed)
+            for speed in self.mobility_speeds
+        ]
+        # pick the slowest (largest dt) so no one overshoots the clock
+        self.dt = max(dt_list)            # seconds per tick (a call to step())
+
+        penalty = self.scenario.slope_penalty
+        if (self.uphill_factor, self.downhill_factor) != (UPHILL_FACTOR, DOWNHILL_FACTOR):
+            penalty = slope_penalties(self.terrain, self.grid_config.cell_size,
+                                      self.uphill_factor, self.downhill_factor)
+        self.move_prob = move_probabilities(penalty, self.base_speed, self.mobility_speeds)
+        self.edge_weight = None
+        if self.routing_mobility is not None:
+            speed = self.mobility_speeds[MOBILITY_TYPES.index(self.routing_mobility)]
+            self.edge_weight = expected_ticks(penalty, self.base_speed, speed)
+
+    def _set_landslide_speed(self, landslide_speed):
+        """
+        landslide_speed is the calibration speed of the fronts, their ground speed and
+        cells per tick follow from it:
+        - a tick lasts time_per_step = step_length / base_speed s, so a front moving
+          at v m/s covers v * time_per_step / step_length = v / base_speed cells per
+          tick, on any grid;
+        - the fronts were calibrated at landslide_speed * base_speed / step_length
+          cells per tick on 1 m cells, which is no unit conversion (m/s * m/s / m);
+          read as cells per tick, it is a ground speed of landslide_speed * base_speed**2
+          m/s, kept on every grid (5.25 -> 11.8 m/s, 7.875 cells per tick)
+        """
+        self.landslide_speed = landslide_speed
+        self.landslide_ground_speed = landslide_speed * self.base_speed**2   # m/s
+        self.ls_cells_per_tick = self.landslide_ground_speed / self.base_speed
+
+    def _set_stuck_threshold(self, max_stuck_threshold):
+        """
+        max_stuck_threshold counts ticks on the native grid, i.e. a wall-clock time
+        of max_stuck_threshold * time_per_step of that grid (40 -> ~26 s). The same
+        time is kept on every grid: a tick lasts cell_size / base_speed s, so it
+        takes max_stuck_threshold * native cell size / cell_size ticks (stuck_ticks)
+        """
+        native = GridConfig(NATIVE_WIDTH, NATIVE_HEIGHT, self.grid_config.bounds)
+        self.max_stuck_threshold = max_stuck_threshold
+        self.stuck_seconds = max_stuck_threshold * native.cell_size / self.base_speed
+        self.stuck_ticks = max(1, round(max_stuck_threshold * native.cell_size / self.grid_config.cell_size))
+
+    # ─── snapshots, see src/model/checkpoint.py
+    # the static layers and what is derived from them are left out and attached again on
+    # restore, so are the trajectory recorder (open files) and the on_finish callback
+    SNAPSHOT_EXCLUDED = ("scenario", "terrain", "obstacle_mask", "path_mask", "landslide_masks",
+                         "move_prob", "edge_weight", "_base_cost", "trajectory", "on_finish")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self.SNAPSHOT_EXCLUDED:
+            state.pop(name, None)
+        return state
+
+    def attach_scenario(self, scenario):
+        """
+        puts back what a snapshot leaves out, on a restored model
+        """
+        if (scenario.width, scenario.height) != (self.width, self.height):
+            raise ValueError(f"scenario is {scenario.width}x{scenario.height}, not {self.width}x{self.height}")
+        self.scenario = scenario
+        self.terrain = scenario.terrain
+        self.obstacle_mask = scenario.obstacle_mask
+        self.path_mask = scenario.path_mask
+        self.landslide_masks = list(scenario.landslide_masks) if self.enable_landslide else []
+        self._base_cost = np.where(np.asarray(self.path_mask).ravel(), 1.0, 2.0)
+        self.trajectory = None
+        self.on_finish = None
+        self._update_movement()
+        if self.router is not None:
+            self.router.attach(self.edge_weight)
+
+    # parameters a restored model can change before it goes on (fork)
+    FORKABLE = ("landslide_speed", "uphill_factor", "downhill_factor", "mobility_speeds",
+                "max_stuck_threshold", "steady_ticks", "run_id", "reports_dir", "on_finish")
+
+    def reseed(self, seed):
+        """
+        every draw from now on comes from seed
+        """
+        self._seed = seed
+        self.random.seed(seed)
+        if self.crowd is not None and self.crowd.rng is not None:
+            self.crowd.rng = np.random.default_rng(seed)
+
+    def set_parameters(self, **params):
+        """
+        changes FORKABLE parameters of a running model, from the next tick on
+        """
+        unknown = set(params) - set(self.FORKABLE)
+        if unknown:
+            raise ValueError(f"cannot change {sorted(unknown)} on a running model, only {self.FORKABLE}")
+        for name in ("steady_ticks", "run_id", "on_finish"):
+            if name in params:
+                setattr(self, name, params[name])
+        if "reports_dir" in params:
+            self.reporter.reports_dir = Path(params["reports_dir"])
+        if "max_stuck_threshold" in params:
+            self._set_stuck_threshold(params["max_stuck_threshold"])
+            if self.crowd is not None:
+                self.crowd.max_stuck_threshold = self.stuck_ticks
+            for agent in self.evacuees:
+                agent.max_stuck_threshold = self.stuck_ticks
+        if "landslide_speed" in params and self.enable_landslide:
+            self._set_landslide_speed(params["landslide_speed"])
+            for wave in self.landslides:
+                wave.cells_per_tick = self.ls_cells_per_tick
+        if {"uphill_factor", "downhill_factor", "mobility_speeds"} & set(params):
+            self.uphill_factor = params.get("uphill_factor", self.uphill_factor)
+            self.downhill_factor = params.get("downhill_factor", self.downhill_factor)
+            if "mobility_speeds" in params:
+                self.mobility_speeds = self._speeds(params["mobility_speeds"])
+                for agent in self.evacuees:
+                    agent.base_speed = float(self.mobility_speeds[MOBILITY_TYPES.index(agent.mobility_type)])
+            self._update_movement()
+            if self.edge_weight is not None:
+                # slope-aware routes: the field is rebuilt on the new weights
+                self.router = None
+                self._router_version = None
+
     def all_agents_done(self):
         """
-        assumes each Evacuee sets self.evacuated=True once it reaches safe_zone
-        or sets self.impacted_by_landslide=True once landslide hits it
-        or sets self.stuck=True when no path is available for too long
+        every evacuee reached a safe zone, was hit by a landslide or got stuck
+        (read from the live counters)
         """
-        evacuees = [a for a in self.schedule.agents if isinstance(a, Evacuee)]
-        if not evacuees:
-            return True
-        return all(
-            a.evacuated
-            or getattr(a, "impacted_by_landslide", False)
-            or getattr(a, "stuck", False)
-            for a in evacuees
-        )
+        return self.agent_counts["active"] == 0
+
+    def agents_finished(self, outcome, n=1, active=None):
+        """
+        live counters: n agents turned "evacuated", "impacted" or "stuck",
+        of which active (default all n) were still active until now
+        (a stuck agent can still be hit by a landslide)
+        """
+        self.agent_counts[outcome] += n
+        self.agent_counts["active"] -= n if active is None else active
 
     def step(self):
         """
@@ -224,52 +416,311 @@ class EvacuationModel(Model):
         1) 10 minute equivalent in step, or
         2) everybody's evacuated
         """
-        # build a dynamic landslide-mask
-        landslide_block = np.zeros_like(self.obstacle_mask, dtype=bool)
-        for agent_obj in self.schedule.agents:
-            if isinstance(agent_obj, Landslide):
-                for (x, y) in agent_obj.front:
-                    if 0 <= x < self.width and 0 <= y < self.height:
-                        landslide_block[y, x] = True
-        # combine static obstacles + landslide blocks
-        self.current_step_combined_obstacle_mask = np.logical_or(self.obstacle_mask, landslide_block)
-
-        # everyone takes their action
-        self.schedule.step()
+        prof = self.profiler
+        moves, version = self.total_moves, self.mask_version
+
+        # the routing field only needs work when the blocked cells changed since it was built
+        with phase_timer(prof, "routing"):
+            if self._router_version == self.mask_version:
+                self.field_reuses += 1
+            else:
+                self._update_router()
+                if prof is not None:
+                    prof.count("field_expanded", self.router.expanded)
+        if self.congestion_weight > 0 and self.current_step % self.routing_interval == 0:
+            with phase_timer(prof, "congestion"):
+                density = crowd_density(self.grid.occupancy, self.num_agents, self.exit_mask)
+                self.router.update_costs(congestion_cost(self._base_cost, density.ravel(), self.congestion_weight))
+
+        # everyone takes their action (the crowd goes first, as evacuees precede
+        # the landslide waves in the schedule)
+        with phase_timer(prof, "evacuees"):
+            if self.crowd is not None:
+                self.crowd.step(self)
+        self._step_schedule()
         self.current_step += 1
 
-        # compute the real time so far
-        elapsed = self.current_step * self.time_per_step
-        for secs, folder in self._report_thresholds.items():
-            if elapsed >= secs and secs not in self._reports_saved:
-                self._reports_saved.add(secs)
-                print(f"Reached ~{int(elapsed)}s → saving report for {folder}")
-                self.reporter.save_report(folder)
+        with phase_timer(prof, "reporting"):
+            if self.trajectory is not None:
+                self.trajectory.record(self)
+
+            # compute the real time so far
+            elapsed = self.current_step * self.time_per_step
+            for secs, folder in self._report_thresholds.items():
+                if elapsed >= secs and secs not in self._reports_saved:
+                    self._reports_saved.add(secs)
+                    logger.info(f"Reached ~{int(elapsed)}s → saving report for {folder}")
+                    self.reporter.save_report(folder)
+        if prof is not None:
+            prof.end_tick()
+
+        if self._stop_if_over():
+            return
+
+        # nothing left to happen but stuck counters counting up: skip to the end
+        quiet = self.total_moves == moves and self.mask_version == version
+        self.quiet_ticks = self.quiet_ticks + 1 if quiet else 0
+        if self._steady_state():
+            self._fast_forward()
 
+    def _stop_if_over(self):
+        """
+        ends the run if everybody is done or the time is up, returns whether it did
+        """
         # stop early if everybody is evacuated
         if self.all_agents_done():
-            print("All agents evacuated or impacted by landslide — stopping early.")
-            self.running = False
-
-            # post simulation
-            self.reporter.save_report("all_done")
-            print('simulation complete!')
-
-            IOLoop.current().stop()
-            return
+            logger.info("All agents evacuated or impacted by landslide — stopping early.")
+            self.finish()
+            return True
 
         # stop on time
         if self.current_step >= self.max_steps:
             real_time = self.current_step * self.dt
-            print(f"Reached {self.current_step} steps (~{real_time:.1f}s) → stopping on time.")
-            self.running = False
+            logger.info(f"Reached {self.current_step} steps (~{real_time:.1f}s) → stopping on time.")
+            self.finish()
+            return True
+        return False
+
+    def _active_evacuees(self):
+        """
+        the evacuees still active, in schedule order: (crowd indices or Evacuee objects,
+        xs, ys, grid slots, stuck counters, stuck thresholds)
+        """
+        if self.crowd is not None:
+            c = self.crowd
+            ids = np.flatnonzero(~c.done)
+            return (ids, c.x[ids], c.y[ids], ids, c.stuck_counter[ids],
+                    np.full(len(ids), c.max_stuck_threshold))
+        agents = [a for a in self.evacuees if not (a.evacuated or a.impacted_by_landslide or a.stuck)]
+        return (
+            agents,
+            np.array([a.pos[0] for a in agents], dtype=np.int64),
+            np.array([a.pos[1] for a in agents], dtype=np.int64),
+            np.array([self.grid.slot_of(a) for a in agents], dtype=np.int64),
+            np.array([a.stuck_counter for a in agents], dtype=np.int64),
+            np.array([a.max_stuck_threshold for a in agents], dtype=np.int64),
+        )
+
+    def _steady_state(self):
+        """
+        True once no active evacuee can ever move again: each one has no route, or its
+        next cell is a building, a prohibited cell, or held by someone who never leaves
+        (landslide, stuck or impacted evacuee, or an active one that cannot move
+        either, chains and cycles included). Only checked after steady_ticks quiet
+        ticks, with every landslide front died out and the congestion costs refreshed
+        on the current crowd
+        """
+        if self.steady_ticks is None or self.quiet_ticks < self.steady_ticks:
+            return False
+        if self.congestion_weight > 0 and self.quiet_ticks < self.routing_interval:
+            return False
+        if self.trajectory is not None:   # every tick has to be recorded
+            return False
+        if any(wave.front_mask.any() for wave in self.landslides):
+            return False
+
+        _, xs, ys, slots, _, _ = self._active_evacuees()
+        nxt = self.router.next_hop.ravel()[ys * self.width + xs]
+        target = np.maximum(nxt, 0)
+        occupant = self.grid.occupancy.ravel()[target]
+        is_exit = self.exit_mask.ravel()[target]
+        # what Evacuee.step checks before moving, minus the speed draw
+        enterable = (nxt >= 0) & (is_exit | self.walkable.ravel()[target])
+        free = enterable & np.where(is_exit, self.open_exit_mask.ravel()[target], occupant == EMPTY)
+
+        # waiting on a cell held by an active evacuee: moves once that one does
+        active_at = np.full(self.grid.num_slots, -1, dtype=np.int64)   # grid slot -> active evacuee
+        active_at[slots] = np.arange(len(slots))
+        waits_on = np.where(enterable & ~is_exit & (occupant >= 0), active_at[np.maximum(occupant, 0)], -1)
+        movable = free
+        while True:
+            more = ~movable & (waits_on >= 0) & movable[np.maximum(waits_on, 0)]
+            if not more.any():
+                return not movable.any()
+            movable |= more
+
+    def _fast_forward(self):
+        """
+        Ends a steady run in one go: every active evacuee only counts ticks without
+        moving until it gets stuck, so the tick each one gets stuck in, the intermediate
+        reports on the way and the end of the run are worked out directly, with the
+        same outcome the remaining ticks would give (the random stream is not advanced)
+        """
+        ids, xs, ys, _, counters, thresholds = self._active_evacuees()
+        start = self.current_step
+        stuck_at = start + thresholds - counters - 1   # schedule.steps of the tick each one gets stuck in
+        end = min(int(stuck_at.max()) + 1, self.max_steps)
+
+        # intermediate reports still due, at the first tick past their threshold
+        due = []
+        for secs, folder in self._report_thresholds.items():
+            if secs in self._reports_saved:
+                continue
+            tick = next((c for c in range(start + 1, end + 1) if c * self.time_per_step >= secs), None)
+            if tick is not None:
+                due.append((tick, secs, folder))
+
+        stuck = np.zeros(len(stuck_at), dtype=bool)
+        for tick, secs, folder in sorted(due, key=lambda d: d[0]) + [(end, None, None)]:
+            for s in np.unique(stuck_at[~stuck & (stuck_at < tick)]).tolist():
+                group = ~stuck & (stuck_at == s)
+                self._advance_to(s)
+                self._stick(ids, xs, ys, group, thresholds)
+                stuck |= group
+            self._advance_to(tick)
+            if folder is not None:
+                self._reports_saved.add(secs)
+                logger.info(f"Reached ~{int(tick * self.time_per_step)}s → saving report for {folder}")
+                self.reporter.save_report(folder)
 
-            # post simulation
-            self.reporter.save_report("all_done")
-            print('simulation complete!')
+        # whoever is left just counted the skipped ticks
+        if self.crowd is not None:
+            self.crowd.stuck_counter[ids[~stuck]] += end - start
+        else:
+            for agent, left in zip(ids, ~stuck):
+                if left:
+                    agent.stuck_counter += end - start
+        self.fast_forwarded += end - start
+        logger.info(f"steady state at tick {start}: fast-forwarded {end - start} ticks")
+        self._stop_if_over()
+
+    def _advance_to(self, tick):
+        """
+        moves the clocks to tick (schedule.steps is also the tick an event is recorded in)
+        """
+        self.schedule.time += tick - self.schedule.steps
+        self.schedule.steps = tick
+        self.current_step = tick
 
-            IOLoop.current().stop()
+    def _stick(self, ids, xs, ys, group, thresholds):
+        """
+        marks the active evacuees in group (boolean over _active_evacuees) stuck, now
+        """
+        threshold = thresholds[group]
+        if self.crowd is not None:
+            c = self.crowd
+            picked = ids[group]
+            c.stuck[picked] = True
+            c.stuck_counter[picked] = threshold
+            self.reporter.record_agents_stuck(c.row[picked], xs[group], ys[group])
+            self.agents_finished("stuck", len(picked))
             return
+        for agent, t in zip((a for a, g in zip(ids, group) if g), threshold.tolist()):
+            agent.stuck = True
+            agent.stuck_counter = t
+            self.reporter.record_agent_stuck(agent)
+            self.agents_finished("stuck")
+
+    def _step_schedule(self):
+        """
+        schedule.step(), profiled: the waves time themselves, whatever else
+        the schedule spends goes to the (mesa) evacuees
+        """
+        prof = self.profiler
+        if prof is None:
+            self.schedule.step()
+            return
+        landslides = prof.spent("landslides")
+        t0 = time.perf_counter()
+        self.schedule.step()
+        spent = time.perf_counter() - t0
+        prof.add_time("evacuees", spent - (prof.spent("landslides") - landslides))
+
+    def finish(self):
+        """
+        Ends the run: writes the final report and hands over to on_finish
+        (e.g. the visualization server stopping its IOLoop)
+        """
+        self.running = False
+
+        # post simulation
+        self.reporter.save_report("all_done")
+        if len(self.exits) > 1:
+            for e, (pos, arrivals) in enumerate(zip(self.exits, self.exit_arrivals.tolist())):
+                logger.info(f"exit {e} at {pos}: {arrivals} evacuees")
+        if self.trajectory is not None:
+            self.trajectory.close()
+        if self.profiler is not None:
+            path = self.reporter.output_path("all_done", "profile")
+            self.profiler.save(path)
+            logger.info(f"Profile written to {path}.json / .csv")
+        logger.info('simulation complete!')
+
+        if self.on_finish is not None:
+            self.on_finish(self)
+
+    def run_until_done(self, max_steps=None):
+        """
+        Headless run loop: steps until the model terminates by itself or
+        max_steps more ticks were taken (the run can be resumed afterwards).
+        Returns True if the run is over
+        """
+        taken = 0
+        while self.running and (max_steps is None or taken < max_steps):
+            self.step()
+            taken += 1
+        return not self.running
+
+    def run_model(self):
+        self.run_until_done()
+
+    def _combined_obstacle_mask(self):
+        """
+        static obstacles + landslide blocks (the waves keep landslide_block current)
+        + full shelters, which stop being routing goals
+        """
+        mask = np.logical_or(self.obstacle_mask, self.landslide_block)
+        mask |= self.exit_mask & ~self.open_exit_mask
+        return mask
+
+    def _update_router(self):
+        """
+        builds or repairs the routing field for the current mask version
+        """
+        self.current_step_combined_obstacle_mask = self._combined_obstacle_mask()
+
+        # one routing field shared by every evacuee (each heads to the nearest open exit),
+        # repaired only around the cells the landslide fronts touched since it was last updated
+        if self.router is None:
+            self.router = IncrementalDistanceField(
+                self.width,
+                self.height,
+                self.exits,
+                path_mask=self.path_mask,
+                obstacle_mask=self.current_step_combined_obstacle_mask,
+                edge_weight=self.edge_weight
+            )
+        else:
+            self.router.update_mask(self.current_step_combined_obstacle_mask)
+        self._router_version = self.mask_version
+        self.field_updates += 1
+
+    def move_landslide_front(self, window, old_front, new_front):
+        """
+        Called by a landslide wave when its front changes: old_front/new_front
+        are boolean masks over window (slices of the grid)
+        """
+        count = self._landslide_front_count[window]
+        count -= old_front
+        count += new_front
+        block = count > 0
+        if (block != self.landslide_block[window]).any():
+            self.landslide_block[window] = block
+            self.mask_version += 1
+
+    def move_landslide_cells(self, old_xs, old_ys, xs, ys):
+        """
+        move_landslide_front with the old and new front as cell coordinates,
+        called by a wave after each spread
+        """
+        count = self._landslide_front_count
+        count[old_ys, old_xs] -= 1
+        count[ys, xs] += 1
+        cys, cxs = np.concatenate([old_ys, ys]), np.concatenate([old_xs, xs])
+        block = count[cys, cxs] > 0
+        if (block != self.landslide_block[cys, cxs]).any():
+            self.landslide_block[cys, cxs] = block
+            self.mask_version += 1
 
     def get_path(self, start, goal):
         """
@@ -282,16 +733,55 @@ class EvacuationModel(Model):
             start,
             goal,
             path_mask=self.path_mask,
-            obstacle_mask=self.current_step_combined_obstacle_mask # Uses the precomputed mask
+            obstacle_mask=self.current_step_combined_obstacle_mask, # Uses the precomputed mask
+            edge_weight=self.edge_weight,
         )
 
+    def get_next_cell(self, pos):
+        """
+        Next cell on the shortest path from pos to the safe zone, read from
+        this tick's distance field. None if the safe zone is unreachable
+        """
+        return self.router.next_cell(pos)
+
+    def is_exit(self, pos):
+        x, y = pos
+        return self.exit_mask[y, x]
+
+    def exit_reached(self, pos):
+        """
+        counts an arrival at the exit in pos, closing it once full
+        """
+        self.exits_reached(np.array([pos[0]]), np.array([pos[1]]))
+
+    def exits_reached(self, xs, ys):
+        """
+        exit_reached for arrays of arrival cells
+        """
+        exits = self.exit_index[ys, xs]
+        np.add.at(self.exit_arrivals, exits, 1)
+        for e in np.unique(exits).tolist():
+            x, y = self.exits[e]
+            if not self.open_exit_mask[y, x] or self.exit_arrivals[e] < self.exit_capacity[e]:
+                continue
+            self.open_exit_mask[y, x] = False
+            self.mask_version += 1
+            logger.info(f"exit {e} at {(x, y)} is full ({self.exit_arrivals[e]} evacuees), closing it")
+
+    def get_move_probability(self, mobility_type, pos, next_pos):
+        """
+        chance that an agent of this mobility type passes the speed check
+        moving from pos to the neighbouring next_pos (slope included)
+        """
+        x, y = pos
+        k = DIRECTIONS[(next_pos[0] - x, next_pos[1] - y)]
+        return self.move_prob[MOBILITY_TYPES.index(mobility_type), y, x, k]
+
     def get_elevation(self, pos):
         # returns elevation at a specific location on the grid
         x, y = pos
         return self.terrain[y, x]
     
     def force_place_agent(self, agent, pos):
-        # Direct low-level assignment to force agent placement
-        x, y = pos
-        agent.pos = pos
-        self.grid._grid[x][y] = agent
+        # force agent placement, whatever occupies the cell
+        self.grid.force_place(agent, pos)
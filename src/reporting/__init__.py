@@ -1,2 +1,5 @@
 from .manager import ReportManager
-__all__ = ['ReportManager']
\ No newline at end of file
+from .profiler import TickProfiler
+from .sketch import QuantileSketch
+from .trajectory import TrajectoryReader, TrajectoryRecorder
+__all__ = ['ReportManager', 'QuantileSketch', 'TickProfiler', 'TrajectoryReader', 'TrajectoryRecorder']
\ No newline at end of file
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""
+Aggregates every *_report_*.csv written by ReportManager.save_report under
+a report directory, per scenario (the directory holding the
+file, e.g. all_risk_areas/minuto_1) and mobility type: evacuation rate,
+impacted / stuck shares and time_spent quantiles.
+
+Files are read in parallel and folded into fixed-size counters and
+QuantileSketch histograms, so memory does not grow with the number of
+files. The aggregate and the files it already holds are kept in a state
+file; the next run only reads the files it has not seen. A file that
+changed or disappeared since is not subtractable, so it triggers a full
+rebuild.
+
+    python -m src.reporting.aggregate reports --workers 8
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.reporting.sketch import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+PATTERN = "*_report_*.csv"
+COLUMNS = ["mobility_type", "evacuated", "impacted_by_landslide", "stuck", "time_spent"]
+ALL = "ALL"     # mobility_type of the rows over every mobility type
+STATE_VERSION = 1
+CHUNK = 64      # files per worker task
+
+
+class GroupStats:
+    """
+    counters and time_spent sketches of one (scenario, mobility type)
+    """
+    def __init__(self, relative_accuracy=0.01):
+        self.runs = 0
+        self.agents = 0
+        self.evacuated = 0
+        self.impacted = 0
+        self.stuck = 0
+        self.time_spent = QuantileSketch(relative_accuracy)        # every agent
+        self.evacuation_time = QuantileSketch(relative_accuracy)   # evacuated agents only
+
+    def add(self, frame):
+        evacuated = frame["evacuated"].to_numpy(dtype=bool)
+        time_spent = frame["time_spent"].to_numpy(dtype=np.float64)
+        self.runs += 1
+        self.agents += len(frame)
+        self.evacuated += int(evacuated.sum())
+        self.impacted += int(frame["impacted_by_landslide"].to_numpy(dtype=bool).sum())
+        self.stuck += int(frame["stuck"].to_numpy(dtype=bool).sum())
+        self.time_spent.add(time_spent)
+        self.evacuation_time.add(time_spent[evacuated])
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.agents += other.agents
+        self.evacuated += other.evacuated
+        self.impacted += other.impacted
+        self.stuck += other.stuck
+        self.time_spent.merge(other.time_spent)
+        self.evacuation_time.merge(other.evacuation_time)
+        return self
+
+    def to_dict(self):
+        return {
+            "runs": self.runs, "agents": self.agents, "evacuated": self.evacuated,
+            "impacted": self.impacted, "stuck": self.stuck,
+            "time_spent": self.time_spent.to_dict(), "evacuation_time": self.evacuation_time.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name in ("runs", "agents", "evacuated", "impacted", "stuck"):
+            setattr(stats, name, data[name])
+        stats.time_spent = QuantileSketch.from_dict(data["time_spent"])
+        stats.evacuation_time = QuantileSketch.from_dict(data["evacuation_time"])
+        return stats
+
+
+def file_signature(path):
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def summarize_files(root, names, relative_accuracy):
+    """
+    {(scenario, mobility type): GroupStats} of a batch of report files,
+    executed inside the worker processes. Returns the names it could read too
+    """
+    root = Path(root)
+    groups, read = {}, []
+    for name in names:
+        try:
+            frame = pd.read_csv(root / name, usecols=COLUMNS)
+        except (OSError, ValueError) as e:
+            logger.warning(f"skipping {name}: {e}")
+            continue
+        read.append(name)
+        scenario = Path(name).parent.as_posix()
+        for mobility, rows in frame.groupby("mobility_type", sort=False):
+            key = (scenario, str(mobility))
+            groups.setdefault(key, GroupStats(relative_accuracy)).add(rows)
+    return groups, read
+
+
+class ReportAggregate:
+    """
+    Running aggregate of the report files under root, with the signature
+    (size, mtime) of every file already folded in
+    """
+    def __init__(self, root, relative_accuracy=0.01):
+        self.root = Path(root)
+        self.relative_accuracy = relative_accuracy
+        self.groups = {}   # (scenario, mobility type) -> GroupStats
+        self.files = {}    # path relative to root -> [size, mtime_ns]
+
+    def merge_groups(self, groups):
+        for key, stats in groups.items():
+            if key in self.groups:
+                self.groups[key].merge(stats)
+            else:
+                self.groups[key] = stats
+
+    def update(self, workers=1):
+        """
+        reads the report files not seen yet, returns how many were read.
+        Starts over if a file already aggregated changed or was removed
+        """
+        current = {p.relative_to(self.root).as_posix(): p for p in self.root.rglob(PATTERN)}
+        stale = [name for name, sig in self.files.items()
+                 if name not in current or file_signature(current[name]) != sig]
+        if stale:
+            logger.warning(f"{len(stale)} aggregated files changed or were removed (e.g. {stale[0]}), rebuilding")
+            self.groups, self.files = {}, {}
+        new = sorted(name for name in current if name not in self.files)
+        signatures = {name: file_signature(current[name]) for name in new}
+
+        chunks = [new[i:i + CHUNK] for i in range(0, len(new), CHUNK)]
+        summarize = functools.partial(summarize_files, str(self.root), relative_accuracy=self.relative_accuracy)
+        if workers <= 1 or len(chunks) <= 1:
+            return self._fold(map(summarize, chunks), signatures)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return self._fold(pool.map(summarize, chunks), signatures)
+
+    def _fold(self, results, signatures):
+        read = 0
+        for groups, names in results:
+            self.merge_groups(groups)
+            for name in names:
+                self.files[name] = signatures[name]
+            read += len(names)
+        return read
+
+    def rows(self, quantiles=(0.5, 0.9, 0.99)):
+        """
+        one summary dict per (scenario, mobility type), plus an ALL row per scenario
+        """
+        scenarios = {}
+        for (scenario, mobility), stats in self.groups.items():
+            scenarios.setdefault(scenario, {})[mobility] = stats
+        files = Counter(Path(name).parent.as_posix() for name in self.files)
+        rows = []
+        for scenario in sorted(scenarios):
+            by_mobility = scenarios[scenario]
+            total = GroupStats(self.relative_accuracy)
+            for stats in by_mobility.values():
+                total.merge(stats)
+            # every file holds every mobility type it has agents of: ALL counts files once
+            total.runs = files[scenario]
+            for mobility, stats in [*sorted(by_mobility.items()), (ALL, total)]:
+                row = {
+                    "scenario": scenario,
+                    "mobility_type": mobility,
+                    "runs": stats.runs,
+                    "agents": stats.agents,
+                    "evacuation_rate": stats.evacuated / stats.agents if stats.agents else np.nan,
+                    "impacted_share": stats.impacted / stats.agents if stats.agents else np.nan,
+                    "stuck_share": stats.stuck / stats.agents if stats.agents else np.nan,
+                }
+                for q in quantiles:
+                    row[f"time_spent_p{q * 100:g}"] = stats.time_spent.quantile(q)
+                for q in quantiles:
+                    row[f"evacuation_time_p{q * 100:g}"] = stats.evacuation_time.quantile(q)
+                rows.append(row)
+        return rows
+
+    def save(self, path):
+        state = {
+            "version": STATE_VERSION,
+            "root": self.root.as_posix(),
+            "relative_accuracy": self.relative_accuracy,
+            "files": self.files,
+            "groups": [[scenario, mobility, stats.to_dict()]
+                       for (scenario, mobility), stats in self.groups.items()],
+        }
+        path = Path(path)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, path)   # an interrupted save keeps the previous state
+
+    @classmethod
+    def load(cls, path, root, relative_accuracy=0.01):
+        """
+        the saved aggregate of root, or an empty one if there is none
+        (or it was made for another root / accuracy)
+        """
+        aggregate = cls(root, relative_accuracy)
+        path = Path(path)
+        if not path.exists():
+            return aggregate
+        state = json.loads(path.read_text())
+        if (state.get("version") != STATE_VERSION or state["root"] != aggregate.root.as_posix()
+                or state["relative_accuracy"] != relative_accuracy):
+            logger.warning(f"{path} was made for another root or accuracy, rebuilding")
+            return aggregate
+        aggregate.files = state["files"]
+        aggregate.groups = {(scenario, mobility): GroupStats.from_dict(data)
+                            for scenario, mobility, data in state["groups"]}
+        return aggregate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate the csv reports of many runs")
+    parser.add_argument("root", type=Path, nargs="?", default=Path("reports"),
+                        help="directory searched recursively for *_report_*.csv (default reports)")
+    parser.add_argument("--state", type=Path, default=None,
+                        help="aggregate state kept between runs (default <root>/aggregate_state.json)")
+    parser.add_argument("--out", type=Path, default=None,
+                        help="summary csv (default <root>/aggregate.csv)")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="worker processes reading files in parallel")
+    parser.add_argument("-q", "--quantile", type=float, action="append", default=None,
+                        help="time_spent quantile to report (repeatable, default 0.5 0.9 0.99)")
+    parser.add_argument("--accuracy", type=float, default=0.01,
+                        help="relative accuracy of the quantiles (changing it rebuilds the state)")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the saved state and read every file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    state = args.state or args.root / "aggregate_state.json"
+    out = args.out or args.root / "aggregate.csv"
+    aggregate = (ReportAggregate(args.root, args.accuracy) if args.rebuild
+                 else ReportAggregate.load(state, args.root, args.accuracy))
+    read = aggregate.update(args.workers)
+    aggregate.save(state)
+    logger.info(f"{read} report files read, {len(aggregate.files)} aggregated in {state}")
+
+    summary = pd.DataFrame(aggregate.rows(tuple(args.quantile or (0.5, 0.9, 0.99))))
+    summary.to_csv(out, index=False)
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.max_rows", None):
+        print(summary.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    logger.info(f"summary written to {out}")
+
+
+if __name__ == "__main__":
+    main()
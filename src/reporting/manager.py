@@ -1,116 +1,284 @@
-import csv
+import logging
 import time
 from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SQRT_TABLE = np.zeros(0)
+
+
+def exact_sqrt(squares):
+    """
+    square roots of non-negative ints, bit-identical to python's n**0.5
+    (np.sqrt can differ in the last bit), through a lookup table grown on demand
+    """
+    global _SQRT_TABLE
+    squares = np.asarray(squares, dtype=np.int64)
+    if len(squares) == 0:
+        return np.zeros(0)
+    top = int(squares.max())
+    if top >= len(_SQRT_TABLE):
+        _SQRT_TABLE = np.array([n**0.5 for n in range(max(top + 1, 2 * len(_SQRT_TABLE)))])
+    return _SQRT_TABLE[squares]
+
 
 class ReportManager:
-    def __init__(self, model):
+    """
+    Per-agent evacuation records kept as preallocated numpy columns.
+    Rows are looked up through an agent_id -> row index, so every record_*
+    call is O(1), and save_report formats whole columns at once.
+    """
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, model, reports_dir="reports/no_landslide"):
         self.model = model
-        # list to hold agent records
-        self.data = []
+        self.reports_dir = Path(reports_dir)
         self.start_time = time.time()
         # columns definition for csv
         self.header = [
             "agent_id", "mobility_type", "start_pos",
             "start_time", "end_time", "distance", "steps",
             "evacuated", "impacted_by_landslide", "stuck",
-            "final_pos", "time_spent"
+            "final_pos", "time_spent", "exit"
         ]
+        self.index = {}   # agent_id -> row
+        self.size = 0     # rows in use
+        self._allocate(self.INITIAL_CAPACITY)
+
+    def _allocate(self, capacity):
+        """
+        (re)allocates every column with room for capacity agents, keeping the rows in use
+        """
+        columns = {
+            "agent_id":              np.empty(capacity, dtype=object),
+            "mobility_type":         np.empty(capacity, dtype=object),
+            "start_x":               np.zeros(capacity, dtype=np.int64),
+            "start_y":               np.zeros(capacity, dtype=np.int64),
+            "start_step":            np.zeros(capacity, dtype=np.int64),
+            "end_step":              np.full(capacity, -1, dtype=np.int64),  # -1 = not finished
+            "distance":              np.zeros(capacity, dtype=np.float64),
+            "steps":                 np.zeros(capacity, dtype=np.int64),
+            "evacuated":             np.zeros(capacity, dtype=bool),
+            "impacted_by_landslide": np.zeros(capacity, dtype=bool),
+            "stuck":                 np.zeros(capacity, dtype=bool),
+            "final_x":               np.zeros(capacity, dtype=np.int64),
+            "final_y":               np.zeros(capacity, dtype=np.int64),
+            "time_spent":            np.zeros(capacity, dtype=np.int64),
+            "exit":                  np.full(capacity, -1, dtype=np.int64),  # safe zone reached, -1 = none
+        }
+        for name, column in columns.items():
+            if hasattr(self, name):
+                column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def _finish(self, row, agent):
+        # end_time, final_pos and time_spent are always set together
+        self.end_step[row] = self.model.schedule.steps
+        self.final_x[row], self.final_y[row] = agent.pos
+        self.time_spent[row] = self.end_step[row] - self.start_step[row]
 
     def record_evacuation_start(self, agent):
         """
         Initializes tracking when agent starts to move
         """
-        entry = {
-            "agent_id": agent.unique_id,  # Unique identifier
-            "mobility_type": agent.mobility_type.name,  # Type as string
-            "start_pos": agent.pos,  # Tuple like (x,y)
-            "start_time": self.model.schedule.steps,  # Current step count
-            "end_time": None,
-            "distance": 0,  # cumulative distance traveled
-            "steps": 0,  # number of movement attempts
-            "evacuated": False,  # success flag  # TODO: colocar tempo para a flag não necessariamente ser true sempre
-            "impacted_by_landslide": False,
-            "stuck": False,
-            "final_pos": None,  # add all fields with default values
-            "time_spent": 0     # always equals as end_time, bc start_time = 0
-        }
-        self.data.append(entry)
+        if self.size == self.capacity:
+            self._allocate(2 * self.capacity)
+        row = self.size
+        self.size += 1
+        self.index[agent.unique_id] = row
 
+        self.agent_id[row] = agent.unique_id                 # Unique identifier
+        self.mobility_type[row] = agent.mobility_type.name   # Type as string
+        self.start_x[row], self.start_y[row] = agent.pos     # Tuple like (x,y)
+        self.start_step[row] = self.model.schedule.steps     # Current step count
+        # every other column starts at its default: not finished, nothing travelled, no flags
 
     def record_movement(self, agent):
         """
         Update movement metrics
         """
-        for entry in self.data:
-            if entry["agent_id"] == agent.unique_id:
-                entry["steps"] += 1
-                dx = agent.pos[0] - entry["start_pos"][0]
-                dy = agent.pos[1] - entry["start_pos"][1]
-                entry["distance"] = (dx**2 + dy**2)**0.5  # euclidean distance > represent straight line distance (x grid cells)
-                break
+        row = self.index.get(agent.unique_id)
+        if row is None:
+            return
+        self.steps[row] += 1
+        dx = agent.pos[0] - int(self.start_x[row])
+        dy = agent.pos[1] - int(self.start_y[row])
+        self.distance[row] = (dx**2 + dy**2)**0.5  # euclidean distance > represent straight line distance (x grid cells)
 
     def record_landslide_impact(self, agent):
-        for entry in self.data:
-            if entry["agent_id"] == agent.unique_id:
-                entry["impacted_by_landslide"] = True
-                entry["end_time"]  = self.model.schedule.steps
-                entry["final_pos"] = agent.pos
-                entry["time_spent"] = entry["end_time"] - entry["start_time"]
-                break
+        row = self.index.get(agent.unique_id)
+        if row is None:
+            return
+        self.impacted_by_landslide[row] = True
+        self._finish(row, agent)
 
     def record_evacuation_end(self, agent):
         """
         Ends data when agent reaches safe zone
         """
-        for entry in self.data:
-            if entry["agent_id"] == agent.unique_id:
-                entry.update({
-                    "end_time": self.model.schedule.steps,  # final step count
-                    "evacuated": True,
-                    "final_pos": agent.pos,  # safe zone position
-                    "time_spent": self.model.schedule.steps - entry["start_time"]
-                })
+        row = self.index.get(agent.unique_id)
+        if row is None:
+            return
+        self.evacuated[row] = True
+        self._finish(row, agent)  # safe zone position
+        x, y = agent.pos
+        self.exit[row] = self.model.exit_index[y, x]
 
     def record_agent_stuck(self, agent):
         """
         Records when agent becomes stuck (can't find path to safety)
         """
-        for entry in self.data:
-            if entry["agent_id"] == agent.unique_id:
-                entry["stuck"] = True
-                entry["end_time"] = self.model.schedule.steps
-                entry["final_pos"] = agent.pos
-                entry["time_spent"] = entry["end_time"] - entry["start_time"]
-                break
+        row = self.index.get(agent.unique_id)
+        if row is None:
+            return
+        self.stuck[row] = True
+        self._finish(row, agent)
+
+    # batched variants for the array engine (src.model.crowd), rows instead of agents
+
+    def _finish_rows(self, rows, xs, ys):
+        self.end_step[rows] = self.model.schedule.steps
+        self.final_x[rows], self.final_y[rows] = xs, ys
+        self.time_spent[rows] = self.end_step[rows] - self.start_step[rows]
+
+    def record_evacuation_starts(self, agent_ids, mobility_names, xs, ys):
+        """
+        record_evacuation_start for a batch of agents, returns their rows
+        """
+        n = len(agent_ids)
+        while self.size + n > self.capacity:
+            self._allocate(2 * self.capacity)
+        rows = np.arange(self.size, self.size + n)
+        self.size += n
+        ids = [int(i) for i in agent_ids]
+        self.index.update(zip(ids, rows.tolist()))
+        self.agent_id[rows] = ids
+        self.mobility_type[rows] = mobility_names
+        self.start_x[rows], self.start_y[rows] = xs, ys
+        self.start_step[rows] = self.model.schedule.steps
+        return rows
+
+    def record_movements(self, rows, xs, ys):
+        self.steps[rows] += 1
+        dx = xs - self.start_x[rows]
+        dy = ys - self.start_y[rows]
+        self.distance[rows] = exact_sqrt(dx * dx + dy * dy)
+
+    def record_landslide_impacts(self, rows, xs, ys):
+        self.impacted_by_landslide[rows] = True
+        self._finish_rows(rows, xs, ys)
+
+    def record_evacuation_ends(self, rows, xs, ys):
+        self.evacuated[rows] = True
+        self._finish_rows(rows, xs, ys)
+        self.exit[rows] = self.model.exit_index[ys, xs]
+
+    def record_agents_stuck(self, rows, xs, ys):
+        self.stuck[rows] = True
+        self._finish_rows(rows, xs, ys)
+
+    @property
+    def data(self):
+        """
+        the records as a list of dicts, one per agent (same shape as the csv rows)
+        """
+        rows = []
+        for row in range(self.size):
+            finished = self.end_step[row] >= 0
+            rows.append({
+                "agent_id": self.agent_id[row],
+                "mobility_type": self.mobility_type[row],
+                "start_pos": (int(self.start_x[row]), int(self.start_y[row])),
+                "start_time": int(self.start_step[row]),
+                "end_time": int(self.end_step[row]) if finished else None,
+                "distance": float(self.distance[row]) if self.steps[row] else 0,
+                "steps": int(self.steps[row]),
+                "evacuated": bool(self.evacuated[row]),
+                "impacted_by_landslide": bool(self.impacted_by_landslide[row]),
+                "stuck": bool(self.stuck[row]),
+                "final_pos": (int(self.final_x[row]), int(self.final_y[row])) if finished else None,
+                "time_spent": int(self.time_spent[row]),
+                "exit": int(self.exit[row]) if self.exit[row] >= 0 else None,
+            })
+        return rows
+
+    def _csv_columns(self):
+        """
+        every column formatted as strings, exactly as csv.DictWriter would write them
+        """
+        n = self.size
+        end = self.end_step[:n]
+        finished = end >= 0
+
+        def pos(xs, ys):
+            # tuples contain a comma, so the csv module quotes them
+            return np.char.add(np.char.add(np.char.add('"(', xs.astype(str)), np.char.add(", ", ys.astype(str))), ')"')
+
+        def flag(col):
+            return np.where(col, "True", "False")
+
+        distance = np.where(self.steps[:n] > 0, self.distance[:n].astype(str), "0")
+        return [
+            self.agent_id[:n].astype(str),
+            self.mobility_type[:n].astype(str),
+            pos(self.start_x[:n], self.start_y[:n]),
+            self.start_step[:n].astype(str),
+            np.where(finished, end.astype(str), ""),
+            distance,
+            self.steps[:n].astype(str),
+            flag(self.evacuated[:n]),
+            flag(self.impacted_by_landslide[:n]),
+            flag(self.stuck[:n]),
+            np.where(finished, pos(self.final_x[:n], self.final_y[:n]), ""),
+            self.time_spent[:n].astype(str),
+            np.where(self.exit[:n] >= 0, self.exit[:n].astype(str), ""),
+        ]
 
     def save_report(self, folder_name: str):
         """
-        Generates a .csv in reports/<folder name>/ with all entries
+        Generates a .csv in <reports_dir>/<folder name>/ with all entries
         """
-        if not any(entry["evacuated"] or entry["impacted_by_landslide"] or entry["stuck"] for entry in self.data):
+        n = self.size
+        if not (self.evacuated[:n] | self.impacted_by_landslide[:n] | self.stuck[:n]).any():
             return
 
-        for entry in self.data:
-            if entry["end_time"] is None:
-                agent = next(
-                    (a for a in self.model.schedule.agents
-                    if a.unique_id == entry["agent_id"]),
-                    None
-                )
+        # agents still on their way get the current step as end time
+        open_rows = np.flatnonzero(self.end_step[:n] < 0)
+        crowd = getattr(self.model, "crowd", None)
+        if crowd is not None:
+            # array engine: agent_id is the crowd index
+            ids = self.agent_id[open_rows].astype(np.int64)
+            alive = ~crowd.impacted[ids]
+            self._finish_rows(open_rows[alive], crowd.x[ids[alive]], crowd.y[ids[alive]])
+        else:
+            scheduled = self.model.schedule._agents
+            for row in open_rows:
+                agent = scheduled.get(self.agent_id[row])
                 if agent is not None:
-                    entry["end_time"]  = self.model.schedule.steps
-                    entry["final_pos"] = agent.pos
-                    entry["time_spent"] = entry["end_time"] - entry["start_time"]
+                    self._finish(row, agent)
+
+        filename = self.output_path(folder_name, "report").with_suffix(".csv")
+
+        lines = [",".join(self.header)]
+        if n:
+            lines.extend(",".join(row) for row in zip(*self._csv_columns()))
+        with open(filename, 'w', newline='') as f:
+            f.write("\r\n".join(lines) + "\r\n")
 
-        reports_dir = Path("reports/no_landslide") / folder_name
+        logger.info(f'Report written to {filename}')
+
+    def output_path(self, folder_name, kind):
+        """
+        <reports_dir>/<folder>/<folder>_<kind>_<timestamp>[_runNNNN], without extension
+        """
+        reports_dir = self.reports_dir / folder_name
         reports_dir.mkdir(parents=True, exist_ok=True)  # making sure the dir is ok
 
         timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filename = reports_dir / f"{folder_name}_report_{timestamp}.csv"
-
-        with open(filename, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.header)
-            writer.writeheader()
-            writer.writerows(self.data)
-        
-        print(f'Report written to {filename}')
\ No newline at end of file
+        run_id = getattr(self.model, "run_id", None)
+        if run_id is None:
+            return reports_dir / f"{folder_name}_{kind}_{timestamp}"
+        # parallel runs can finish within the same second
+        return reports_dir / f"{folder_name}_{kind}_{timestamp}_run{run_id:04d}"
@@ -0,0 +1,95 @@
+import json
+import time
+from pathlib import Path
+import numpy as np
+
+# wall-clock phases of a tick (seconds)
+PHASES = ("routing", "congestion", "evacuees", "landslides", "reporting")
+# work counted per tick
+COUNTERS = (
+    "field_expanded",    # routing field vertices (re)expanded by the LPA* repair
+    "landslide_cells",   # cells newly reached by landslide waves
+    "buildings_buried",
+    "moves",             # evacuees that moved
+    "blocked_moves",     # evacuees that passed the speed check but found their next cell taken
+)
+
+
+class TickProfiler:
+    """
+    Opt-in per-tick instrumentation: one row per tick with the time spent
+    in each phase and the work counters, kept in numpy arrays.
+    The model only calls into it when profiling is on (model.profiler is None otherwise).
+    """
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self.ticks = 0
+        self.times = np.zeros((self.INITIAL_CAPACITY, len(PHASES)))
+        self.counts = np.zeros((self.INITIAL_CAPACITY, len(COUNTERS)), dtype=np.int64)
+        self._phase = {name: i for i, name in enumerate(PHASES)}
+        self._counter = {name: i for i, name in enumerate(COUNTERS)}
+
+    def end_tick(self):
+        """
+        closes the current row; whatever is booked from now on goes to the next tick
+        """
+        self.ticks += 1
+        if self.ticks == len(self.times):
+            self.times = np.concatenate([self.times, np.zeros_like(self.times)])
+            self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+
+    def add_time(self, phase, seconds):
+        self.times[self.ticks, self._phase[phase]] += seconds
+
+    def spent(self, phase):
+        """
+        time already booked to phase in the current tick
+        """
+        return self.times[self.ticks, self._phase[phase]]
+
+    def count(self, counter, n=1):
+        self.counts[self.ticks, self._counter[counter]] += n
+
+    def summary(self):
+        times, counts = self.times[:self.ticks], self.counts[:self.ticks]
+        return {
+            "ticks": self.ticks,
+            "seconds": {name: float(times[:, i].sum()) for i, name in enumerate(PHASES)},
+            "ms_per_tick": {
+                name: 1e3 * float(times[:, i].mean()) if self.ticks else 0.0
+                for i, name in enumerate(PHASES)
+            },
+            "counters": {name: int(counts[:, i].sum()) for i, name in enumerate(COUNTERS)},
+        }
+
+    def save(self, path):
+        """
+        writes <path>.json (totals / means) and <path>.csv (one row per tick)
+        """
+        path = Path(path)
+        with open(path.with_suffix(".json"), "w") as f:
+            json.dump(self.summary(), f, indent=1)
+        table = np.column_stack([np.arange(self.ticks), self.times[:self.ticks], self.counts[:self.ticks]])
+        fmt = ["%d"] + ["%.6f"] * len(PHASES) + ["%d"] * len(COUNTERS)
+        np.savetxt(path.with_suffix(".csv"), table, fmt=fmt, delimiter=",",
+                   header=",".join(("tick",) + PHASES + COUNTERS), comments="")
+
+
+class phase_timer:
+    """
+    with phase_timer(model.profiler, "routing"): ... (no-op when profiler is None)
+    """
+    __slots__ = ("profiler", "phase", "t0")
+
+    def __init__(self, profiler, phase):
+        self.profiler = profiler
+        self.phase = phase
+
+    def __enter__(self):
+        if self.profiler is not None:
+            self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.profiler is not None:
+            self.profiler.add_time(self.phase, time.perf_counter() - self.t0)
@@ -0,0 +1,117 @@
+import math
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch of non-negative values (DDSketch-style):
+    log-spaced buckets, so any quantile comes back within relative_accuracy
+    of a true value, whatever the number of values added. Two sketches of the
+    same accuracy merge by adding their bucket counts, so partial sketches of
+    many files / processes combine exactly into the sketch of all of them.
+    Values below min_value (zero ticks) are counted apart and come back as 0.
+    """
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.offset = 0                               # bucket index of counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket(self, values):
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def _extend(self, lo, hi):
+        """
+        makes room for bucket indices lo..hi
+        """
+        if not len(self.counts):
+            self.offset = lo
+            self.counts = np.zeros(hi - lo + 1, dtype=np.int64)
+            return
+        new_lo = min(lo, self.offset)
+        new_hi = max(hi, self.offset + len(self.counts) - 1)
+        if (new_lo, new_hi) == (self.offset, self.offset + len(self.counts) - 1):
+            return
+        counts = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+        counts[self.offset - new_lo:self.offset - new_lo + len(self.counts)] = self.counts
+        self.offset, self.counts = new_lo, counts
+
+    def add(self, values):
+        """
+        adds an array of values at once
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        if (values < 0).any():
+            raise ValueError("QuantileSketch only takes non-negative values")
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        small = values < self.min_value
+        self.zero_count += int(small.sum())
+        buckets = self._bucket(values[~small])
+        if len(buckets):
+            self._extend(int(buckets.min()), int(buckets.max()))
+            self.counts += np.bincount(buckets - self.offset, minlength=len(self.counts))
+
+    def merge(self, other):
+        """
+        adds every value of other (same relative accuracy) to this sketch
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("only sketches of the same relative accuracy merge")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(other.counts):
+            self._extend(other.offset, other.offset + len(other.counts) - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + len(other.counts)] += other.counts
+        return self
+
+    def quantile(self, q):
+        """
+        value at quantile q (0..1), nan on an empty sketch
+        """
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative = np.cumsum(self.counts)
+        k = int(np.searchsorted(cumulative, rank - self.zero_count, side="right"))
+        # middle of bucket (gamma^(i-1), gamma^i], clamped to the values seen
+        value = 2 * self.gamma ** (self.offset + k) / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "offset": self.offset,
+            "counts": self.counts.tolist(),
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"], data["min_value"])
+        sketch.offset = data["offset"]
+        sketch.counts = np.array(data["counts"], dtype=np.int64)
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        return sketch
@@ -0,0 +1,190 @@
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+import numpy as np
+
+# fixed-width records, one per agent per tick / one per landslide front cell per tick
+AGENT_DTYPE = np.dtype([
+    ("tick", "<u4"), ("agent_id", "<i4"), ("x", "<i2"), ("y", "<i2"), ("state", "u1"),
+])
+FRONT_DTYPE = np.dtype([
+    ("tick", "<u4"), ("x", "<i2"), ("y", "<i2"),
+])
+
+# agent states
+ACTIVE, EVACUATED, IMPACTED, STUCK = 0, 1, 2, 3
+
+
+def agent_state(agent):
+    if agent.evacuated:
+        return EVACUATED
+    if agent.impacted_by_landslide:
+        return IMPACTED
+    if agent.stuck:
+        return STUCK
+    return ACTIVE
+
+
+class TrajectoryRecorder:
+    """
+    Opt-in per-tick trajectory sink.
+    Every tick's agent positions/states and landslide front cells are buffered
+    as fixed-width records; each full chunk of ticks is handed to a background
+    thread that writes it as a compressed .npz, so the simulation loop never
+    waits on disk. index.json is refreshed after every chunk written, so a run
+    that stops early (or dies) can still be read up to its last full chunk;
+    close() flushes the last chunk. A failed write is raised again from the
+    next record() or from close(), and nothing is written after it.
+    """
+    def __init__(self, path, chunk_ticks=100):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk_ticks = chunk_ticks
+        self.chunks = []      # (file name, first tick, last tick) of the chunks on disk
+        self._agents = []
+        self._fronts = []
+        self._first_tick = None
+        self._last_tick = None
+        self._queued = 0      # chunks handed to the writer
+        self._failed = False
+        self._error = None    # exception of the writer thread, not raised yet
+        self._write_index()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self._writer.start()
+        self.closed = False
+
+    def _write_chunks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._failed:
+                continue
+            name, first, last, agents, fronts = item
+            try:
+                np.savez_compressed(self.path / name, agents=agents, fronts=fronts)
+                self.chunks.append((name, first, last))
+                self._write_index()
+            except Exception as e:
+                self._failed = True
+                self._error = e
+
+    def _write_index(self):
+        index = {
+            "chunks": [
+                {"file": name, "first_tick": first, "last_tick": last}
+                for name, first, last in self.chunks
+            ],
+        }
+        tmp = self.path / "index.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.path / "index.json")
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def record(self, model):
+        """
+        snapshot of the model after model.current_step ticks
+        """
+        self._raise_error()
+        tick = model.current_step
+        crowd = getattr(model, "crowd", None)
+        if crowd is not None:
+            agents = np.empty(crowd.n, dtype=AGENT_DTYPE)
+            agents["tick"] = tick
+            agents["agent_id"] = np.arange(crowd.n)
+            agents["x"], agents["y"] = crowd.x, crowd.y
+            # same precedence as agent_state
+            agents["state"] = np.select(
+                [crowd.evacuated, crowd.impacted, crowd.stuck], [EVACUATED, IMPACTED, STUCK], ACTIVE)
+        else:
+            evacuees = model.evacuees
+            agents = np.empty(len(evacuees), dtype=AGENT_DTYPE)
+            agents["tick"] = tick
+            agents["agent_id"] = [a.unique_id for a in evacuees]
+            agents["x"] = [a.pos[0] for a in evacuees]
+            agents["y"] = [a.pos[1] for a in evacuees]
+            agents["state"] = [agent_state(a) for a in evacuees]
+
+        front = [pos for wave in model.landslides for pos in wave.front]
+        fronts = np.empty(len(front), dtype=FRONT_DTYPE)
+        fronts["tick"] = tick
+        if front:
+            fronts["x"], fronts["y"] = zip(*front)
+
+        if self._first_tick is None:
+            self._first_tick = tick
+        self._last_tick = tick
+        self._agents.append(agents)
+        self._fronts.append(fronts)
+        if len(self._agents) >= self.chunk_ticks:
+            self._flush()
+
+    def _flush(self):
+        if not self._agents:
+            return
+        name = f"chunk_{self._queued:06d}.npz"
+        self._queued += 1
+        self._queue.put((name, self._first_tick, self._last_tick,
+                         np.concatenate(self._agents), np.concatenate(self._fronts)))
+        self._agents, self._fronts = [], []
+        self._first_tick = None
+
+    def close(self):
+        if self.closed:
+            return
+        self._flush()
+        self._queue.put(None)
+        self._writer.join()
+        self.closed = True
+        self._raise_error()
+
+
+class TrajectoryReader:
+    """
+    Replays a recorded run: at(tick) returns the agents and landslide front
+    of that tick straight from the store, without simulating
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "index.json") as f:
+            self.chunks = json.load(f)["chunks"]
+        self._cached_name = None
+        self._cached = None
+
+    @property
+    def ticks(self):
+        if not self.chunks:
+            return range(0)
+        return range(self.chunks[0]["first_tick"], self.chunks[-1]["last_tick"] + 1)
+
+    def _load(self, chunk):
+        if self._cached_name != chunk["file"]:
+            with np.load(self.path / chunk["file"]) as data:
+                self._cached = (data["agents"], data["fronts"])
+            self._cached_name = chunk["file"]
+        return self._cached
+
+    def at(self, tick):
+        """
+        (agents, fronts) structured arrays of the given tick
+        """
+        for chunk in self.chunks:
+            if chunk["first_tick"] <= tick <= chunk["last_tick"]:
+                agents, fronts = self._load(chunk)
+                # records are appended in tick order
+                a0, a1 = np.searchsorted(agents["tick"], [tick, tick + 1])
+                f0, f1 = np.searchsorted(fronts["tick"], [tick, tick + 1])
+                return agents[a0:a1], fronts[f0:f1]
+        raise KeyError(f"tick {tick} was not recorded")
+
+    def __iter__(self):
+        for tick in self.ticks:
+            yield (tick, *self.at(tick))
@@ -1,5 +1,7 @@
+import logging
 from .server import server
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     server.port = 8521
     server.launch()
@@ -1,6 +1,63 @@
 #!/usr/bin/env python
 import argparse
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from src.mobility import MobilityType
+from src.model.checkpoint import fork, snapshot
 from src.model.simulation import EvacuationModel
+from src.utils.scenario import NATIVE_HEIGHT, NATIVE_WIDTH, GridConfig, load_scenario
+
+logger = logging.getLogger("src.run_batch")
+
+
+def configure_logging(verbosity):
+    """
+    batch runs only report their progress by default,
+    -v adds the model messages (reports, thresholds), -vv every stuck agent
+    """
+    level = {0: logging.WARNING, 1: logging.INFO}.get(verbosity, logging.DEBUG)
+    logging.basicConfig(level=level, format="%(message)s")
+    logger.setLevel(min(level, logging.INFO))
+
+
+def run_seeds(master_seed, runs):
+    """
+    one independent seed per run, derived from the master seed only,
+    so run i gets the same seed whatever the worker count
+    """
+    children = np.random.SeedSequence(master_seed).spawn(runs)
+    return [int(c.generate_state(1)[0]) for c in children]
+
+
+def run_one(i, seed, config):
+    """
+    runs a single replication, executed inside the worker processes
+    """
+    logger.info(f"=== Starting run {i} (seed {seed}) ===")
+    config = dict(config)
+    trajectories = config.pop("trajectories")
+    warm = config.pop("snapshot", None)
+    if trajectories:
+        config["trajectory_path"] = f"{trajectories}/run{i:04d}"
+    if warm is not None:
+        # the opening phase is shared, the run goes on from it with its own seed
+        model = fork(warm, seed=seed, run_id=i)
+    else:
+        model = EvacuationModel(seed=seed, run_id=i, **config)
+    try:
+        model.run_until_done()
+    finally:
+        # a run cut short (error, Ctrl-C) still gets its last trajectory chunk written
+        if model.trajectory is not None:
+            model.trajectory.close()
+    logger.info(
+        f"run {i}: routing field reused on {model.field_reuses} of "
+        f"{model.field_reuses + model.field_updates} ticks"
+        + (f", {model.fast_forwarded} steady ticks skipped" if model.fast_forwarded else "")
+    )
+    return i, model.current_step
 
 def main():
     parser = argparse.ArgumentParser(
@@ -13,13 +70,19 @@ def main():
         help="Number of simulation runs"
     )
     parser.add_argument(
-        "--width", type=int, default=220,
+        "--width", type=int, default=NATIVE_WIDTH,
         help="Grid width"
     )
     parser.add_argument(
-        "--height", type=int, default=180,
+        "--height", type=int, default=NATIVE_HEIGHT,
         help="Grid height"
     )
+    parser.add_argument(
+        "--cell-size", type=float, default=None,
+        help="Cell size in metres, overrides --width/--height with the grid that fits the map "
+             "(native grid ~0.98; up to 1.5 stays close to the finest grid and suits sweeps, 2 and above "
+             "is too coarse, see README)"
+    )
     parser.add_argument(
         "--num_agents", type=int, default=480,
         help="Number of agents per run"
@@ -48,20 +111,125 @@ def main():
         help="Disable landslide simulation",
     )
     parser.set_defaults(enable_landslide=True)
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Number of worker processes running replications in parallel"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None,
+        help="Master seed, per-run seeds are derived from it (random if omitted)"
+    )
+    parser.add_argument(
+        "--trajectories", metavar="DIR", default=None,
+        help="Record every tick of each run to DIR/runNNNN (compressed .npz chunks)"
+    )
+    parser.add_argument(
+        "--engine", choices=["mesa", "array", "batched"], default="mesa",
+        help="mesa: one agent object per evacuee; array: vectorized crowd, same results, faster for large crowds; "
+             "batched: array with batched numpy speed draws, fastest, but not the same random stream as mesa"
+    )
+    parser.add_argument(
+        "--routing-mobility", dest="routing_mobility", default=None,
+        choices=[mt.name for mt in MobilityType],
+        help="Make routes slope-aware, weighting moves by how long this mobility type takes on them"
+    )
+    parser.add_argument(
+        "--safe-zone", dest="safe_zones", action="append", nargs=3,
+        metavar=("X", "Y", "CAPACITY"), default=None,
+        help="A shelter at (X, Y) taking CAPACITY evacuees ('none' = unlimited); repeat for several. "
+             "Default: one unlimited shelter at (0, height-1)"
+    )
+    parser.add_argument(
+        "--congestion-weight", dest="congestion_weight", type=float, default=0.0,
+        help="Route around crowds: entering a cell costs (1 + weight * local crowd density) more (0 = off)"
+    )
+    parser.add_argument(
+        "--routing-interval", dest="routing_interval", type=int, default=1,
+        help="Ticks between congestion refreshes of the routing field (higher = faster, less accurate)"
+    )
+    parser.add_argument(
+        "--steady-ticks", dest="steady_ticks", type=int, default=10,
+        help="Quiet ticks after which a run where nobody can move anymore skips to its end (0 = never)"
+    )
+    parser.add_argument(
+        "--fork-at", dest="fork_at", type=float, metavar="SECONDS", default=None,
+        help="Simulate the first SECONDS once (master seed) and fork every run from that state "
+             "with its own seed, so runs only pay for what comes after (e.g. 60 for minute 1)"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Time every tick by phase and count the work done, saved as all_done_profile_*.json/.csv"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="count", default=0,
+        help="-v: model messages, -vv: also every stuck agent (slower)"
+    )
     args = parser.parse_args()
+    configure_logging(args.verbose)
+    if args.fork_at is not None and args.trajectories:
+        parser.error("--fork-at runs start mid-way, they cannot record trajectories")
+
+    master_seed = args.seed
+    if master_seed is None:
+        master_seed = int(np.random.SeedSequence().entropy % 2**63)
+    logger.info(f"master seed: {master_seed}")
+    seeds = run_seeds(master_seed, args.runs)
+
+    if args.cell_size is not None:
+        grid = GridConfig.from_cell_size(args.cell_size)
+        args.width, args.height = grid.width, grid.height
+    grid = GridConfig(args.width, args.height)
+    logger.info(f"grid: {grid.width}x{grid.height} cells of {grid.cell_size:.2f} m")
+
+    config = dict(
+        width=args.width,
+        height=args.height,
+        num_agents=args.num_agents,
+        pwd_ratio=args.pwd_ratio,
+        active_areas=args.active_areas,
+        enable_landslide=args.enable_landslide,
+        trajectories=args.trajectories,
+        engine=args.engine,
+        routing_mobility=MobilityType[args.routing_mobility] if args.routing_mobility else None,
+        safe_zones=[
+            (int(x), int(y), None if cap.lower() == "none" else int(cap))
+            for x, y, cap in args.safe_zones
+        ] if args.safe_zones else None,
+        congestion_weight=args.congestion_weight,
+        routing_interval=args.routing_interval,
+        profile=args.profile,
+        steady_ticks=args.steady_ticks or None,
+    )
+
+    # build the scenario bundle once up front; workers memory-map the same files,
+    # so terrain and masks are shared through the page cache instead of pickled
+    load_scenario(args.width, args.height)
+
+    if args.fork_at is not None:
+        warm_config = dict(config)
+        warm_config.pop("trajectories")
+        warm = EvacuationModel(seed=master_seed, run_id=0, **warm_config)
+        ticks = math.ceil(args.fork_at / warm.time_per_step)
+        if warm.run_until_done(max_steps=ticks):
+            parser.error(f"the run is over after {warm.current_step} ticks, before --fork-at {args.fork_at}s")
+        config["snapshot"] = snapshot(warm)
+        logger.info(f"runs fork from tick {warm.current_step} (~{warm.current_step * warm.time_per_step:.0f}s), "
+                    f"snapshot of {len(config['snapshot']) / 1e3:.0f} kB")
 
-    for i in range(1, args.runs + 1):
-        print(f"\n=== Starting run {i} of {args.runs} ===")
-        model = EvacuationModel(
-            width=args.width,
-            height=args.height,
-            num_agents=args.num_agents,
-            pwd_ratio=args.pwd_ratio,
-            active_areas=args.active_areas,
-            enable_landslide=args.enable_landslide,
-        )
-        model.run_model()
-    print("\nAll done!")
+    if args.workers <= 1:
+        for i, seed in enumerate(seeds, start=1):
+            run_one(i, seed, config)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=configure_logging,
+                                 initargs=(args.verbose,)) as pool:
+            futures = [
+                pool.submit(run_one, i, seed, config)
+                for i, seed in enumerate(seeds, start=1)
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                i, steps = future.result()
+                logger.info(f"=== run {i} finished after {steps} steps ({done} of {args.runs}) ===")
+    logger.info("All done!")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+"""
+Parameter sweeps driven by a JSON manifest, e.g. experiments/speeds_lhs.json:
+
+    {
+      "name": "speeds_lhs",
+      "design": "lhs",
+      "samples": 16,
+      "replications": 5,
+      "seed": 42,
+      "fixed": {"num_agents": 480, "engine": "array", "cell_size": 1.5},
+      "parameters": {
+        "landslide_speed": {"low": 3.0, "high": 8.0},
+        "max_stuck_threshold": {"low": 20, "high": 200, "integer": true},
+        "speed.VISUAL": {"low": 0.3, "high": 0.6}
+      }
+    }
+
+design is grid, lhs (Latin hypercube) or sobol (scrambled Sobol sequence),
+samples the number of lhs / sobol points, replications the seeded runs per
+point. Parameters and fixed values are EvacuationModel arguments; speed.<MOBILITY>
+sets the speed of one MobilityType and cell_size picks the grid as in
+run_batch. A grid design takes a list of values per parameter instead of a
+range and runs every combination.
+
+Replication r of every point uses the same seed (common random numbers), so
+points differ by their parameters only. Each finished run is appended to
+<out>/results.jsonl under a key hashed from its config and seed; a sweep
+started again skips the keys already there, so an interrupted sweep resumes
+where it stopped. results.csv is rewritten from it once all runs are done.
+
+    python -m src.run_sweep experiments/speeds_lhs.json --workers 8
+"""
+import argparse
+import csv
+import hashlib
+import inspect
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import numpy as np
+from scipy.stats import qmc
+from src.mobility import MobilityType
+from src.model.simulation import EvacuationModel
+from src.run_batch import configure_logging, run_seeds
+from src.utils.scenario import NATIVE_HEIGHT, NATIVE_WIDTH, GridConfig, load_scenario
+
+logger = logging.getLogger("src.run_sweep")
+
+DESIGNS = ("grid", "lhs", "sobol")
+SPEED_PREFIX = "speed."
+# set per run by the sweep itself
+RESERVED = {"self", "seed", "run_id", "on_finish", "scenario", "reports_dir", "trajectory_path"}
+MODEL_ARGS = set(inspect.signature(EvacuationModel.__init__).parameters) - RESERVED
+
+
+def check_names(names):
+    for name in names:
+        if name.startswith(SPEED_PREFIX):
+            if name[len(SPEED_PREFIX):] not in MobilityType.__members__:
+                raise ValueError(f"unknown mobility type in {name!r}")
+        elif name not in MODEL_ARGS and name != "cell_size":
+            raise ValueError(f"{name!r} is not a model parameter")
+
+
+def design_points(manifest):
+    """
+    list of {parameter: value}, one per design point
+    """
+    design = manifest.get("design", "grid")
+    if design not in DESIGNS:
+        raise ValueError(f"unknown design {design!r}, expected one of {DESIGNS}")
+    params = manifest.get("parameters", {})
+    check_names(params)
+    names = sorted(params)
+    if not names:
+        return [{}]
+
+    if design == "grid":
+        for name in names:
+            if not isinstance(params[name], list):
+                raise ValueError(f"grid designs take a list of values, got {params[name]!r} for {name!r}")
+        return [dict(zip(names, values)) for values in itertools.product(*(params[n] for n in names))]
+
+    ranges = []
+    for name in names:
+        spec = params[name]
+        if isinstance(spec, list):
+            spec = dict(zip(("low", "high"), spec))
+        if not {"low", "high"} <= set(spec) or spec["low"] > spec["high"]:
+            raise ValueError(f"{design} designs take a low <= high range, got {params[name]!r} for {name!r}")
+        ranges.append(spec)
+    seed = manifest.get("seed", 0)
+    if design == "lhs":
+        sampler = qmc.LatinHypercube(d=len(names), seed=seed)
+    else:
+        # scrambled; a power of 2 of samples keeps the sequence balanced (scipy warns otherwise)
+        sampler = qmc.Sobol(d=len(names), scramble=True, seed=seed)
+    unit = sampler.random(int(manifest["samples"]))
+
+    points = []
+    for row in unit:
+        point = {}
+        for name, spec, u in zip(names, ranges, row):
+            if spec.get("integer"):
+                # every integer of [low, high] gets the same share of the unit interval
+                point[name] = int(min(spec["low"] + np.floor(u * (spec["high"] - spec["low"] + 1)), spec["high"]))
+            else:
+                point[name] = float(spec["low"] + u * (spec["high"] - spec["low"]))
+        points.append(point)
+    return points
+
+
+def model_config(fixed, point):
+    """
+    EvacuationModel keyword arguments of one design point
+    """
+    values = {**fixed, **point}
+    config, speeds = {}, {}
+    for name, value in values.items():
+        if name.startswith(SPEED_PREFIX):
+            speeds[name[len(SPEED_PREFIX):]] = value
+        else:
+            config[name] = value
+    if speeds:
+        config["mobility_speeds"] = {**config.get("mobility_speeds", {}), **speeds}
+    cell_size = config.pop("cell_size", None)
+    if cell_size is not None:
+        grid = GridConfig.from_cell_size(cell_size)
+        config["width"], config["height"] = grid.width, grid.height
+    config.setdefault("width", NATIVE_WIDTH)
+    config.setdefault("height", NATIVE_HEIGHT)
+    return config
+
+
+def run_key(config, seed):
+    """
+    names a run by everything that decides its outcome
+    """
+    text = json.dumps({"config": config, "seed": seed}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def plan(manifest):
+    """
+    every run of the sweep as (key, point, replication, seed, parameters, config)
+    """
+    fixed = manifest.get("fixed", {})
+    check_names(fixed)
+    seeds = run_seeds(manifest.get("seed", 0), int(manifest.get("replications", 1)))
+    runs = []
+    for p, point in enumerate(design_points(manifest)):
+        config = model_config(fixed, point)
+        for r, seed in enumerate(seeds):
+            runs.append((run_key(config, seed), p, r, seed, point, config))
+    return runs
+
+
+def finished_runs(path):
+    """
+    {key: record} of the runs already in results.jsonl; a line cut short by an
+    interrupted sweep is dropped from the file, so the run is simply done again
+    """
+    if not path.exists():
+        return {}
+    done, broken = {}, False
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                done[record["key"]] = record
+            except (ValueError, KeyError):
+                broken = True
+    if broken:
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            for record in done.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp, path)
+    return done
+
+
+def outcome(model):
+    """
+    outcome counts and mean evacuation time (s) of one finished run
+    """
+    rep = model.reporter
+    n = rep.size
+    evacuated = rep.evacuated[:n]
+    return {
+        "agents": n,
+        "evacuated": model.agent_counts["evacuated"],
+        "impacted": model.agent_counts["impacted"],
+        "stuck": model.agent_counts["stuck"],
+        "active": model.agent_counts["active"],
+        "mean_evacuation_s": float(rep.time_spent[:n][evacuated].mean() * model.time_per_step)
+        if evacuated.any() else None,
+        "steps": model.current_step,
+        "simulated_s": model.current_step * model.time_per_step,
+        "fast_forwarded": model.fast_forwarded,
+    }
+
+
+def run_config(key, seed, config, reports_dir):
+    """
+    runs a single sweep run, executed inside the worker processes
+    """
+    config = dict(config)
+    routing_mobility = config.get("routing_mobility")
+    if isinstance(routing_mobility, str):
+        config["routing_mobility"] = MobilityType[routing_mobility]
+    keep = reports_dir is not None
+    reports_dir = f"{reports_dir}/{key}" if keep else tempfile.mkdtemp(prefix="evacuation_sweep_")
+    try:
+        t0 = time.perf_counter()
+        model = EvacuationModel(seed=seed, reports_dir=reports_dir, **config)
+        model.run_until_done()
+        result = outcome(model)
+        result["wall_s"] = time.perf_counter() - t0
+    finally:
+        if not keep:
+            shutil.rmtree(reports_dir, ignore_errors=True)
+    return key, result
+
+
+def export_csv(records, path):
+    """
+    one row per run of this sweep: its parameters then its outcome
+    """
+    rows = [
+        {"key": r["key"], "point": r["point"], "replication": r["replication"], "seed": r["seed"],
+         **r["parameters"], **r["outcome"]}
+        for r in sorted(records, key=lambda r: (r["point"], r["replication"]))
+    ]
+    columns = list(dict.fromkeys(name for row in rows for name in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a parameter sweep of the EvacuationModel from a manifest"
+    )
+    parser.add_argument("manifest", type=Path, help="JSON manifest of the sweep")
+    parser.add_argument(
+        "--out", type=Path, default=None,
+        help="Output directory (default reports/sweeps/<manifest name>)"
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Number of worker processes running sweep runs in parallel"
+    )
+    parser.add_argument(
+        "--keep-reports", action="store_true",
+        help="Keep the csv reports of every run in <out>/runs/<key> (default: only the sweep results)"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Only print how many runs the sweep has and how many are left"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="count", default=0,
+        help="-v: model messages, -vv: also every stuck agent (slower)"
+    )
+    args = parser.parse_args()
+    configure_logging(args.verbose)
+    logger.setLevel(logging.DEBUG if args.verbose > 1 else logging.INFO)   # progress is always shown, as in run_batch
+
+    manifest = json.loads(args.manifest.read_text())
+    out = args.out or Path("reports/sweeps") / manifest.get("name", args.manifest.stem)
+    runs = plan(manifest)
+    results = out / "results.jsonl"
+    done = finished_runs(results)
+    todo = [run for run in runs if run[0] not in done]
+    logger.info(f"{len(runs)} runs ({len(runs) - len(todo)} already done, {len(todo)} to go) in {out}")
+    if args.dry_run:
+        return
+
+    out.mkdir(parents=True, exist_ok=True)
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    reports_dir = str(out / "runs") if args.keep_reports else None
+    # build every grid's scenario bundle once up front, workers memory-map the same files
+    for width, height in sorted({(c["width"], c["height"]) for *_, c in todo}):
+        load_scenario(width, height)
+
+    by_key = {run[0]: run for run in todo}
+    failed = 0
+    with open(results, "a") as f:
+        def record(key, result):
+            _, p, r, seed, point, config = by_key[key]
+            entry = {"key": key, "point": p, "replication": r, "seed": seed,
+                     "parameters": point, "config": config, "outcome": result}
+            done[key] = entry
+            f.write(json.dumps(entry) + "\n")
+            f.flush()   # a run is only skipped on resume once its line is complete
+
+        def finished(n, key, get_result):
+            # a failed run is logged and left out of the results, the next sweep retries it
+            try:
+                record(*get_result())
+            except Exception:
+                logger.exception(f"run {key} failed")
+                return 1
+            logger.info(f"=== run {key} finished ({n} of {len(todo)}) ===")
+            return 0
+
+        if args.workers <= 1:
+            for n, (key, _, _, seed, _, config) in enumerate(todo, start=1):
+                failed += finished(n, key, lambda: run_config(key, seed, config, reports_dir))
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=configure_logging,
+                                     initargs=(args.verbose,)) as pool:
+                futures = {
+                    pool.submit(run_config, key, seed, config, reports_dir): key
+                    for key, _, _, seed, _, config in todo
+                }
+                for n, future in enumerate(as_completed(futures), start=1):
+                    failed += finished(n, futures[future], future.result)
+
+    if failed:
+        logger.warning(f"{failed} runs failed, run the sweep again to retry them")
+        raise SystemExit(1)
+    export_csv([done[run[0]] for run in runs], out / "results.csv")
+    logger.info(f"All done! results in {out / 'results.csv'}")
+
+
+if __name__ == "__main__":
+    main()
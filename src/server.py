@@ -1,11 +1,11 @@
+from tornado.ioloop import IOLoop
+import numpy as np
 from mesa.visualization.ModularVisualization import ModularServer
 from mesa.visualization.modules import CanvasGrid
 from src.model.simulation import EvacuationModel
-from src.agents.building import Building
+from src.model.grid import BUILDING
 from src.agents.landslide import Landslide
-
-GRID_W = 220
-GRID_H = 180
+from src.utils.scenario import NATIVE_HEIGHT as GRID_H, NATIVE_WIDTH as GRID_W
 
 class ReportEnabledServer(ModularServer):
     _has_run = False
@@ -13,12 +13,38 @@ class ReportEnabledServer(ModularServer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    def reset_model(self):
+        """
+        The server hosts this model, so it is the one stopping the IOLoop when the run ends
+        """
+        super().reset_model()
+        self.model.on_finish = lambda model: IOLoop.current().stop()
+
     def launch(self, port=None):
         """
         Run model to completion before showing visualization
         """
         super().launch(port)
 
+BUILDING_PORTRAYAL = {
+    "Shape": "rect",
+    "Color": "#555555",
+    "Filled": "true",
+    "Layer": 0,
+    "w": 1, "h": 1
+}
+
+class BuildingCanvasGrid(CanvasGrid):
+    """
+    buildings are data in the grid's occupancy array, not agents, so draw them from it
+    """
+    def render(self, model):
+        grid_state = super().render(model)
+        ys, xs = np.nonzero(model.grid.occupancy == BUILDING)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            grid_state[BUILDING_PORTRAYAL["Layer"]].append(dict(BUILDING_PORTRAYAL, x=x, y=y))
+        return grid_state
+
 def agent_portrayal(agent):
     """
     sets size, shape and color
@@ -26,15 +52,7 @@ def agent_portrayal(agent):
     if agent is None:
         return None
 
-    if isinstance(agent, Building):
-        return {
-            "Shape": "rect",
-            "Color": "#555555",
-            "Filled": "true",
-            "Layer": 0,
-            "w": 1, "h": 1
-        }
-    elif isinstance(agent, Landslide):
+    if isinstance(agent, Landslide):
         return {
             "Shape": "rect",
             "Color": "#a52a2a",  # reddish-brown for landslide front
@@ -50,7 +68,7 @@ def agent_portrayal(agent):
         "Layer": 0
     }
 
-grid = CanvasGrid(agent_portrayal, GRID_W, GRID_H, 700, 580) # grid with pixels
+grid = BuildingCanvasGrid(agent_portrayal, GRID_W, GRID_H, 700, 580) # grid with pixels
 
 server = ReportEnabledServer( # GUI simulation
     EvacuationModel,
@@ -0,0 +1,24 @@
+# src/utils/congestion.py
+import numpy as np
+from scipy.ndimage import convolve
+
+KERNEL_SIZE = 3  # smoothing window, in cells
+
+
+def crowd_density(occupancy, num_agents, exit_mask, size=KERNEL_SIZE):
+    """
+    share of the size x size window around each cell taken by evacuees
+    (they hold grid slots 0..num_agents-1); safe zones never count as crowded.
+    Counted on integers, so cells away from the crowd are exactly 0
+    """
+    occupied = ((occupancy >= 0) & (occupancy < num_agents) & ~exit_mask).astype(np.int32)
+    counts = convolve(occupied, np.ones((size, size), dtype=np.int32), mode="constant")
+    return counts / (size * size)
+
+
+def congestion_cost(base_cost, density, weight):
+    """
+    cost of entering each cell: the path/off-path cost raised by the local density
+    (>= base_cost, so the routing heuristics stay admissible)
+    """
+    return base_cost * (1.0 + weight * density)
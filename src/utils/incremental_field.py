@@ -0,0 +1,228 @@
+# src/utils/incremental_field.py
+import heapq
+import numpy as np
+from src.utils.pathfinding import (MOORE_OFFSETS, back_directions, distance_field, moore_neighbors,
+                                   neighbor_weights, unit_weights)
+
+INF = float("inf")
+# a repair that pops more than this share of the vertices is dropped for one
+# full distance_field pass, which is cheaper from there on
+REBUILD_SHARE = 0.1
+
+
+class IncrementalDistanceField:
+    """
+    Distance/next-hop field to the nearest of several goals (exits), kept up to date with LPA*.
+    Same graph as distance_field: moore neighbourhood, entering a path cell
+    costs 1 and any other cell 2 (or what update_costs set, times the
+    edge_weight of the move if given), obstacle cells are never entered.
+    A blocked goal (e.g. a full shelter) is no longer reachable, so agents
+    route to the next nearest one.
+    The field is built by distance_field. When cells get blocked or freed only
+    the vertices whose distance really changes are re-expanded, instead of
+    re-running Dijkstra on the whole grid, unless the repair grows past
+    REBUILD_SHARE of the vertices.
+    Among equally short moves the next hop is the first in MOORE_OFFSETS order,
+    whatever order the repairs came in, so the field always matches distance_field.
+    """
+    def __init__(self, width, height, goals, *, path_mask=None, obstacle_mask=None, edge_weight=None):
+        self.width = width
+        self.height = height
+        n = width * height
+        self.goals = [gy * width + gx for gx, gy in goals]
+        self.is_goal = [False] * n
+        for goal in self.goals:
+            self.is_goal[goal] = True
+
+        if path_mask is not None:
+            self.cost = np.where(np.asarray(path_mask).ravel(), 1.0, 2.0).tolist()
+        else:
+            self.cost = [2.0] * n
+        if obstacle_mask is not None:
+            self._mask = np.array(obstacle_mask, dtype=bool)
+        else:
+            self._mask = np.zeros((height, width), dtype=bool)
+        self.blocked = self._mask.ravel().tolist()
+
+        self.attach(edge_weight)
+
+        self.expanded = 0     # vertices popped by the last repair
+        self.rebuilds = 0     # repairs dropped for a full rebuild
+        self._rebuild()
+
+    def attach(self, edge_weight):
+        """
+        the static graph: neighbour table and the move weights aligned with it
+        """
+        self.neighbors = moore_neighbors(self.width, self.height)
+        # back[u][j]: direction of u seen from neighbors[u][j]; rank[v - u]: direction of the move u -> v
+        self.back = back_directions(self.width, self.height)
+        self.rank = {dy * self.width + dx: k for k, (dx, dy) in enumerate(MOORE_OFFSETS)}
+        # weights aligned with neighbors: out_w[u][j] for u -> v, in_w[u][j] for v -> u
+        self.edge_weight = edge_weight
+        if edge_weight is not None:
+            self.out_w, self.in_w = neighbor_weights(edge_weight)
+        else:
+            self.out_w = self.in_w = unit_weights(self.width, self.height)
+
+    def __getstate__(self):
+        # the static graph is left out of model snapshots, attach() rebuilds it on restore
+        state = self.__dict__.copy()
+        for name in ("neighbors", "back", "rank", "edge_weight", "out_w", "in_w"):
+            del state[name]
+        return state
+
+    # ─── LPA* core
+    def _update_vertex(self, u):
+        """
+        recompute rhs(u) from its neighbours and queue u if inconsistent
+        (the first of equally short moves wins, neighbours are in MOORE_OFFSETS order)
+        """
+        if not self.is_goal[u]:
+            best, best_v = INF, -1
+            g, cost, blocked = self.g, self.cost, self.blocked
+            for v, weight in zip(self.neighbors[u], self.out_w[u]):
+                if blocked[v]:
+                    continue
+                c = cost[v] * weight + g[v]
+                if c < best:
+                    best, best_v = c, v
+            self.rhs[u] = best
+            self.succ[u] = best_v
+        if self.g[u] != self.rhs[u]:
+            heapq.heappush(self._open, (min(self.g[u], self.rhs[u]), u))
+
+    def _rebuild(self):
+        """
+        g / rhs / succ from one distance_field pass on the current costs and
+        mask: a consistent LPA* state, so later update() calls keep repairing it
+        """
+        goals = [(goal % self.width, goal // self.width) for goal in self.goals]
+        dist, pred = distance_field(
+            self.width, self.height, goals,
+            obstacle_mask=self._mask, edge_weight=self.edge_weight, cell_cost=np.array(self.cost),
+        )
+        self.g = dist.ravel().tolist()
+        self.rhs = list(self.g)
+        self.succ = pred.ravel().tolist()   # next hop towards the goal, -1 if none
+        self._open = []
+
+    def _compute(self):
+        g, rhs, succ = self.g, self.rhs, self.succ
+        cost, blocked, neighbors, in_w, back = self.cost, self.blocked, self.neighbors, self.in_w, self.back
+        rank = self.rank
+        is_goal = self.is_goal
+        heap = self._open
+        expanded = 0
+        limit = REBUILD_SHARE * len(g)
+        while heap:
+            k, u = heapq.heappop(heap)
+            gu, ru = g[u], rhs[u]
+            if gu == ru or k != min(gu, ru):
+                continue    # stale entry
+            expanded += 1
+            if expanded > limit:
+                # the change reaches too far for a repair to pay off
+                self._rebuild()
+                self.rebuilds += 1
+                break
+            if gu > ru:
+                # overconsistent: distance went down, relax the neighbours
+                g[u] = ru
+                if blocked[u]:
+                    continue
+                cu = cost[u]
+                for w, weight, d in zip(neighbors[u], in_w[u], back[u]):
+                    c = cu * weight + ru
+                    r = rhs[w]
+                    if c > r or is_goal[w]:
+                        continue
+                    if c < r:
+                        rhs[w] = c
+                        succ[w] = u
+                        heapq.heappush(heap, (min(g[w], c), w))
+                    elif d < rank[succ[w] - w]:
+                        succ[w] = u     # as short, earlier in MOORE_OFFSETS
+            else:
+                # underconsistent: distance went up, re-derive u and whoever routed through it
+                g[u] = INF
+                self._update_vertex(u)
+                for w in neighbors[u]:
+                    if succ[w] == u:
+                        self._update_vertex(w)
+        self.expanded = expanded
+
+    # ─── public api
+    def update(self, blocked_cells=(), freed_cells=()):
+        """
+        apply cells (x, y) that became obstacles or walkable since the last
+        call and repair the field around them
+        """
+        width, neighbors = self.width, self.neighbors
+        for x, y in blocked_cells:
+            b = y * width + x
+            if self.blocked[b]:
+                continue
+            self.blocked[b] = True
+            self._mask[y, x] = True
+            for w in neighbors[b]:
+                if self.succ[w] == b:
+                    self._update_vertex(w)
+        for x, y in freed_cells:
+            f = y * width + x
+            if not self.blocked[f]:
+                continue
+            self.blocked[f] = False
+            self._mask[y, x] = False
+            cf, gf = self.cost[f], self.g[f]
+            if gf == INF:
+                continue    # nothing can go through a cell with no way out
+            for w, weight, d in zip(neighbors[f], self.in_w[f], self.back[f]):
+                c = cf * weight + gf
+                r = self.rhs[w]
+                if c > r or self.is_goal[w]:
+                    continue
+                if c < r:
+                    self.rhs[w] = c
+                    self.succ[w] = f
+                    heapq.heappush(self._open, (min(self.g[w], c), w))
+                elif d < self.rank[self.succ[w] - w]:
+                    self.succ[w] = f
+        self._compute()
+
+    def update_costs(self, cost):
+        """
+        new cost of entering each cell (flat, e.g. with a congestion term).
+        Such costs change all over the crowd at once, so the field is rebuilt in
+        one Dijkstra pass rather than repaired vertex by vertex
+        """
+        self.cost = np.asarray(cost, dtype=np.float64).ravel().tolist()
+        self._rebuild()
+        self.expanded = 0
+
+    def update_mask(self, obstacle_mask):
+        """
+        diff a full obstacle mask against the current one and repair
+        """
+        changed = self._mask != obstacle_mask
+        ys, xs = np.nonzero(changed & obstacle_mask)
+        blocked = zip(xs.tolist(), ys.tolist())
+        ys, xs = np.nonzero(changed & ~obstacle_mask)
+        freed = zip(xs.tolist(), ys.tolist())
+        self.update(blocked, freed)
+
+    def next_cell(self, pos):
+        x, y = pos
+        nxt = self.succ[y * self.width + x]
+        if nxt < 0:
+            return None
+        return (nxt % self.width, nxt // self.width)
+
+    @property
+    def dist(self):
+        return np.array(self.rhs).reshape(self.height, self.width)
+
+    @property
+    def next_hop(self):
+        return np.array(self.succ, dtype=np.int64).reshape(self.height, self.width)
+
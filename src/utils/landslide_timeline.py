@@ -0,0 +1,105 @@
+# src/utils/landslide_timeline.py
+"""
+Landslide timelines: the expansion each cell of a risk area is reached in
+by a wave, when nothing but the buildings is in its way. They only depend
+on the static masks, so they are computed once per wave with the scenario
+bundle (src/utils/scenario.py). A wave replays its timeline and repairs it
+whenever the live grid disagrees (see Landslide._correct).
+
+Expansions, not ticks: the tick of an expansion follows from the wave's
+cells_per_tick, so one timeline serves every landslide speed.
+"""
+import numpy as np
+from scipy.ndimage import label
+
+NEVER = np.iinfo(np.int32).max   # arrival of a cell no expansion reaches
+
+# structuring elements: (dx, dy) offsets a front cell spreads to in one expansion
+STRUCTURES = {
+    "up": ((-1, 1), (0, 1), (1, 1), (-1, 0), (1, 0)),
+}
+
+
+def wave_fronts(mask):
+    """
+    the waves of a risk area mask, as the base front [(x, y), ...] of each:
+    one wave per connected component (usually 1), starting on its lowest row
+    """
+    labeled, n_comp = label(mask)
+    fronts = []
+    for comp in range(1, n_comp + 1):
+        coords = np.argwhere(labeled == comp)
+        base_row = coords[:, 0].min()
+        fronts.append([(int(col), int(base_row)) for row, col in coords if row == base_row])
+    return fronts
+
+
+def mask_window(mask):
+    """
+    bounding box of a mask as (rows, cols) slices, the only cells its waves touch
+    """
+    ys, xs = np.nonzero(mask)
+    return slice(ys.min(), ys.max() + 1), slice(xs.min(), xs.max() + 1)
+
+
+def successors(cells, shape, offsets):
+    """
+    flat cells one move away from the flat cells of a (height, width) window
+    (moves leaving the window are dropped, duplicates are kept)
+    """
+    height, width = shape
+    ys, xs = np.divmod(cells, width)
+    reached = []
+    for dx, dy in offsets:
+        ny, nx = ys + dy, xs + dx
+        inside = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+        reached.append(ny[inside] * width + nx[inside])
+    return np.concatenate(reached) if reached else np.zeros(0, dtype=np.int64)
+
+
+def arrival_layers(area, base, blocked, offsets):
+    """
+    expansion in which a wave starting on base first reaches each cell of
+    area (NEVER if it does not), as Landslide._spread grows it on an empty
+    grid: a reached cell stops the front if it is blocked (a building) or on
+    base (already landslide), and is taken otherwise. Boolean windows in,
+    flat int32 out
+    """
+    shape = area.shape
+    area, base, blocked = area.ravel(), base.ravel(), blocked.ravel()
+    arrival = np.full(area.shape, NEVER, dtype=np.int32)
+    front = np.flatnonzero(base)
+    layer = 0
+    while len(front):
+        layer += 1
+        cells = np.unique(successors(front, shape, offsets))
+        cells = cells[area[cells] & (arrival[cells] == NEVER)]
+        arrival[cells] = layer
+        front = cells[~blocked[cells] & ~base[cells]]
+    return arrival
+
+
+def wave_timelines(landslide_masks, obstacles, direction="up"):
+    """
+    the timeline of every wave of every risk area, for the scenario bundle:
+    (arrival, area) with arrival[w] the full-grid arrival layers of wave w
+    (-1 = never) and area[w] the index of its risk area, waves in the order
+    of wave_fronts
+    """
+    offsets = STRUCTURES[direction]
+    arrivals, areas = [], []
+    for idx, mask in enumerate(landslide_masks):
+        mask = np.asarray(mask, dtype=bool)
+        window = mask_window(mask)
+        area = mask[window]
+        for front in wave_fronts(mask):
+            base = np.zeros(area.shape, dtype=bool)
+            for x, y in front:
+                base[y - window[0].start, x - window[1].start] = True
+            layers = arrival_layers(area, base, np.asarray(obstacles, dtype=bool)[window], offsets)
+            full = np.full(mask.shape, -1, dtype=np.int32)
+            full[window] = np.where(layers == NEVER, -1, layers).reshape(area.shape)
+            arrivals.append(full)
+            areas.append(idx)
+    shape = (len(arrivals),) + np.shape(obstacles)
+    return (np.stack(arrivals) if arrivals else np.zeros(shape, dtype=np.int32)), np.array(areas, dtype=np.int32)
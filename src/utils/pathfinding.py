@@ -1,8 +1,20 @@
+import heapq
 import os
+from functools import lru_cache
 import numpy as np
-import geopandas as gpd
-from shapely.geometry import Point
-from queue import PriorityQueue
+from scipy.sparse import csr_matrix
+from rasterio.transform import Affine
+from scipy.sparse.csgraph import dijkstra
+from src.utils.rasterize import rasterize_shapefile
+
+INF = float("inf")
+
+# moore neighbourhood (dx, dy), same cells as grid.get_neighborhood(moore=True)
+MOORE_OFFSETS = (
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1),           (0, 1),
+    (1, -1),  (1, 0),  (1, 1),
+)
 
 def load_elevation(width, height):
     """
@@ -16,17 +28,17 @@ def load_paths(width, height, shapefile):
     reads shapefile and creates boolean mask of grid cells that lie on a path
     """
     os.environ["SHAPE_RESTORE_SHX"] = "YES"
-    
-    file = gpd.read_file(shapefile)
+
     # false = no path, true = path present
-    mask = np.zeros((height, width), dtype=bool)
+    # cell (x, y) is tested at its center point (x + 0.5, y + 0.5), i.e. in grid coordinates
+    return rasterize_shapefile(shapefile, Affine.identity(), width, height)
 
-    for y in range(height): # check if its center point is contained in any of the geometries
-        for x in range(width):
-            cell_point = Point(x + 0.5, y + 0.5)
-            if file.contains(cell_point).any():
-                mask[y, x] = True
-    return mask
+def _flat_view(array, dtype):
+    """
+    zero-copy flat memoryview of an array: indexing it with a Python int is
+    much cheaper than indexing the array itself
+    """
+    return memoryview(np.ascontiguousarray(array, dtype=dtype).ravel())
 
 def a_star_path(
     grid,
@@ -35,47 +47,222 @@ def a_star_path(
     *,
     path_mask:     np.ndarray | None = None,
     obstacle_mask: np.ndarray | None = None,
+    edge_weight:   np.ndarray | None = None,
+    stats:         dict | None = None,
 ):
     """
     Finding shortest paths with A* algorithm
     If a cell is on a path (per path_mask), it has lower movement cost
+    edge_weight (height, width, 8), >= 1, scales the cost of each move
+    (e.g. slope, see src/utils/slope.py)
+    stats, if given, gets the number of expanded nodes under "expanded"
+    Per-query state lives in dicts keyed by y*width+x, so a query only pays
+    for the cells it reaches; the frontier is a heapq
     """
-    frontier = PriorityQueue()
-    frontier.put((0, start))
-    came_from = {start: None}
-    cost_so_far = {start: 0}
+    width, height = grid.width, grid.height
+    blocked = _flat_view(obstacle_mask, bool) if obstacle_mask is not None else None
+    on_path = _flat_view(path_mask, bool) if path_mask is not None else None
+    weights = _flat_view(edge_weight, np.float64) if edge_weight is not None else None
+    k = len(MOORE_OFFSETS)
 
-    # Manhattan distance heuristic
-    def heuristic(a, b):
-        ax, ay = a
-        bx, by = b
-        return abs(ax - bx) + abs(ay - by)     # Manhattan distance
+    sx, sy = start
+    gx, gy = goal
+    s, g = sy * width + sx, gy * width + gx
 
-    while not frontier.empty():
-        _, current = frontier.get()
-        if current == goal:
-            break
+    # heuristic: chebyshev distance times the cheapest cell to enter. Every move,
+    # diagonals included, enters one cell and weighs >= 1, so it never overestimates
+    floor = 1.0 if path_mask is not None and path_mask.any() else 2.0
 
-        for n in grid.get_neighborhood(current, moore=True, include_center=False):
+    cost_so_far = {s: 0.0}
+    came_from = {}
+    closed = set()
+    # among equal estimates the deeper node goes first, which cuts the ties on open ground
+    frontier = [(floor * max(abs(sx - gx), abs(sy - gy)), 0.0, s)]
+    expanded = 0
+    while frontier:
+        _, _, current = heapq.heappop(frontier)
+        if current == g:
+            break
+        if current in closed:
+            continue    # stale heap entry
+        closed.add(current)
+        expanded += 1
+        current_cost = cost_so_far[current]
+        cy, cx = divmod(current, width)
 
-            # 1) block out buildings
-            if obstacle_mask is not None and obstacle_mask[n[1], n[0]]:
+        for d, (dx, dy) in enumerate(MOORE_OFFSETS):
+            nx, ny = cx + dx, cy + dy
+            if not (0 <= nx < width and 0 <= ny < height):
                 continue
+            nb = ny * width + nx
+            # entering a path cell costs 1, any other cell 2, obstacles are never entered
+            if blocked is not None and blocked[nb]:
+                continue
+            step = 1.0 if on_path is not None and on_path[nb] else 2.0
+            if weights is not None:
+                step *= weights[current * k + d]
+            new_cost = current_cost + step
+            if new_cost < cost_so_far.get(nb, INF):
+                cost_so_far[nb] = new_cost
+                came_from[nb] = current
+                heapq.heappush(frontier, (new_cost + floor * max(abs(nx - gx), abs(ny - gy)), -new_cost, nb))
 
-            # 2) movement cost
-            step_cost = 1 if (path_mask is not None and path_mask[n[1], n[0]]) else 2
-            new_cost  = cost_so_far[current] + step_cost
-
-            if n not in cost_so_far or new_cost < cost_so_far[n]:
-                cost_so_far[n] = new_cost
-                priority       = new_cost + heuristic(goal, n)
-                frontier.put((priority, n))
-                came_from[n] = current
+    if stats is not None:
+        stats["expanded"] = expanded
 
     # reconstruct the path from the start to goal if reachable
-    path = []
-    curr = goal
-    while curr and curr in came_from:
-        path.insert(0, curr)
-        curr = came_from[curr]
-    return path
+    if s != g and g not in came_from:
+        return []
+    path = [g]
+    while path[-1] != s:
+        path.append(came_from[path[-1]])
+    path.reverse()
+    return [(u % width, u // width) for u in path]
+
+@lru_cache(maxsize=4)
+def moore_neighbors(width, height):
+    """
+    flat neighbour table: moore_neighbors(w, h)[y*w+x] lists the flat
+    indices of the in-bounds moore neighbours of (x, y)
+    """
+    table = _moore_table(width, height).reshape(-1, len(MOORE_OFFSETS))
+    return _aligned(table, _moore_valid(width, height))
+
+@lru_cache(maxsize=4)
+def _moore_valid(width, height):
+    """
+    (width*height, 8) True where the neighbour in direction MOORE_OFFSETS[k] is on the grid
+    """
+    ys, xs = np.mgrid[0:height, 0:width]
+    return np.stack([
+        ((xs + dx >= 0) & (xs + dx < width) & (ys + dy >= 0) & (ys + dy < height)).ravel()
+        for dx, dy in MOORE_OFFSETS
+    ], axis=1)
+
+def _aligned(per_direction, valid):
+    """
+    (n, 8) values -> lists aligned with moore_neighbors (off-grid directions dropped)
+    """
+    rows = np.asarray(per_direction).tolist()
+    # only cells on the grid's border have off-grid directions
+    for u in np.flatnonzero(~valid.all(axis=1)).tolist():
+        rows[u] = [value for value, ok in zip(rows[u], valid[u].tolist()) if ok]
+    return rows
+
+def _shared(values, valid):
+    """
+    the same 8 values for every cell -> lists aligned with moore_neighbors;
+    cells with the same off-grid directions share one (read-only) list
+    """
+    codes = valid.dot(1 << np.arange(len(MOORE_OFFSETS)))
+    lists = {code: [value for d, value in enumerate(values) if code >> d & 1] for code in np.unique(codes).tolist()}
+    return [lists[code] for code in codes.tolist()]
+
+@lru_cache(maxsize=4)
+def back_directions(width, height):
+    """
+    lists aligned with moore_neighbors: the MOORE_OFFSETS index of the move
+    from each neighbour back to the cell (MOORE_OFFSETS is symmetric)
+    """
+    return _shared(range(len(MOORE_OFFSETS) - 1, -1, -1), _moore_valid(width, height))
+
+@lru_cache(maxsize=4)
+def unit_weights(width, height):
+    """
+    neighbor_weights of an unweighted grid (every move weighs 1)
+    """
+    return _shared([1.0] * len(MOORE_OFFSETS), _moore_valid(width, height))
+
+def neighbor_weights(edge_weight):
+    """
+    edge_weight (height, width, 8) as lists aligned with moore_neighbors:
+    out[u][j] weighs the move u -> neighbors[u][j], into[u][j] the move neighbors[u][j] -> u
+    """
+    height, width, k = edge_weight.shape
+    valid = _moore_valid(width, height)
+    # the move into (x, y) from its neighbour in direction k goes the opposite way,
+    # which is direction 7 - k (MOORE_OFFSETS is symmetric)
+    incoming = np.ones_like(edge_weight)
+    for d, (dx, dy) in enumerate(MOORE_OFFSETS):
+        incoming[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0), d] = \
+            edge_weight[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0), k - 1 - d]
+    return (_aligned(np.asarray(edge_weight).reshape(-1, k), valid),
+            _aligned(incoming.reshape(-1, k), valid))
+
+@lru_cache(maxsize=4)
+def _moore_table(width, height):
+    """
+    (width*height*8,) flat index of the neighbour of each cell in each MOORE_OFFSETS direction, -1 off the grid
+    """
+    cell, nbr, direction = _moore_edges(width, height)
+    table = np.full(width * height * len(MOORE_OFFSETS), -1, dtype=np.int64)
+    table[cell * len(MOORE_OFFSETS) + direction] = nbr
+    return table
+
+@lru_cache(maxsize=4)
+def _moore_edges(width, height):
+    """
+    all in-bounds (cell, neighbour) pairs of the grid as flat indices (y*width+x),
+    with the MOORE_OFFSETS direction of each
+    """
+    ys, xs = np.mgrid[0:height, 0:width]
+    src, dst, direction = [], [], []
+    for k, (dx, dy) in enumerate(MOORE_OFFSETS):
+        nx, ny = xs + dx, ys + dy
+        ok = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        src.append((ys * width + xs)[ok])
+        dst.append((ny * width + nx)[ok])
+        direction.append(np.full(int(ok.sum()), k))
+    return np.concatenate(src), np.concatenate(dst), np.concatenate(direction)
+
+def distance_field(
+    width,
+    height,
+    goals: list[tuple[int, int]],
+    *,
+    path_mask:     np.ndarray | None = None,
+    obstacle_mask: np.ndarray | None = None,
+    edge_weight:   np.ndarray | None = None,
+    cell_cost:     np.ndarray | None = None,
+):
+    """
+    Multi-source reverse Dijkstra from the goals over the same graph a_star_path searches
+    (moore neighbourhood, entering a path cell costs 1, any other cell 2,
+    times the edge_weight of the move if given, obstacle cells are never entered).
+    cell_cost (height, width) replaces the path/off-path entering costs (e.g. congestion)
+    Returns (dist, next_hop), both shaped (height, width):
+    dist[y, x] is the cost from (x, y) to the nearest goal (inf if unreachable) and
+    next_hop[y, x] is the flat index (y*width+x) of the next cell, -1 if none.
+    Among equally short moves the next hop is the first in MOORE_OFFSETS order,
+    as in IncrementalDistanceField
+    """
+    cell, nbr, direction = _moore_edges(width, height)
+
+    cost = np.full(width * height, 2.0)
+    if path_mask is not None:
+        cost[path_mask.ravel()] = 1.0
+    if cell_cost is not None:
+        cost = np.asarray(cell_cost, dtype=np.float64).ravel()
+
+    # reversed edges: nbr -> cell, paying the cost of entering nbr
+    # an obstacle can still get a next hop (agent standing on it), but is never entered
+    if obstacle_mask is not None:
+        keep = ~obstacle_mask.ravel()[nbr]
+        cell, nbr, direction = cell[keep], nbr[keep], direction[keep]
+    weight = cost[nbr]
+    if edge_weight is not None:
+        weight = weight * np.asarray(edge_weight).reshape(-1, len(MOORE_OFFSETS))[cell, direction]
+    graph = csr_matrix((weight, (nbr, cell)), shape=(width * height, width * height))
+
+    sources = [gy * width + gx for gx, gy in goals]
+    dist = dijkstra(graph, directed=True, indices=sources, min_only=True)
+
+    # next hop read off dist rather than dijkstra's predecessors, whose ties depend on its visiting order:
+    # argmin over the 8 directions picks the first of equally short moves
+    n, k = width * height, len(MOORE_OFFSETS)
+    through = np.full(n * k, np.inf)
+    through[cell * k + direction] = weight + dist[nbr]
+    best = through.reshape(n, k).argmin(axis=1) + np.arange(0, n * k, k)
+    next_hop = np.where(through[best] < np.inf, _moore_table(width, height)[best], -1)
+    next_hop[sources] = -1
+    return dist.reshape(height, width), next_hop.reshape(height, width)
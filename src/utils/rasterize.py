@@ -0,0 +1,35 @@
+# src/utils/rasterize.py
+import numpy as np
+import geopandas as gpd
+from rasterio import features
+from rasterio.transform import Affine
+
+
+def grid_transform(bounds, width, height):
+    """
+    affine mapping (col, row) of a width x height grid onto bounds, row 0 on top
+    """
+    cell_width  = (bounds.right - bounds.left) / width
+    cell_height = (bounds.top - bounds.bottom) / height
+    return Affine.translation(bounds.left, bounds.top) * Affine.scale(cell_width, -cell_height)
+
+
+def burn_geometries(geometries, transform, width, height):
+    """
+    Boolean (height, width) mask of the geometries, burned in one
+    rasterio.features.rasterize pass: a polygon takes the cells whose centre
+    lies inside it, a line every cell it runs through
+    """
+    shapes = [(geom, 1) for geom in geometries if geom is not None and not geom.is_empty]
+    if not shapes:
+        return np.zeros((height, width), dtype=bool)
+    burned = features.rasterize(shapes, out_shape=(height, width), transform=transform, fill=0, dtype="uint8")
+    return burned.astype(bool)
+
+
+def rasterize_shapefile(shp, transform, width, height):
+    """
+    reads a shapefile and burns all its geometries into one boolean mask
+    """
+    gdf = gpd.read_file(shp)
+    return burn_geometries(gdf.geometry.values, transform, width, height)
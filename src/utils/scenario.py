@@ -0,0 +1,212 @@
+# src/utils/scenario.py
+import functools
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import rasterio
+from scipy.ndimage import map_coordinates
+from src.utils.landslide_timeline import wave_timelines
+from src.utils.pathfinding import load_elevation, load_paths
+from src.utils.rasterize import grid_transform, rasterize_shapefile
+from src.utils.slope import slope_penalties
+
+BUNDLE_VERSION = 4
+CACHE_DIR = Path("data/cache")
+
+# the georeferenced raster the grid is laid over, and the grid the processed layers were made for
+RASTER_FILE = "data/raw/satellite_georeferenced.tif"
+NATIVE_WIDTH, NATIVE_HEIGHT = 220, 180
+
+ELEVATION_FILE = "data/processed/elevation.npy"
+OBSTACLE_FILE = "data/processed/obstacle_mask.npy"
+PATHS_SHAPEFILE = "data/raw/Caminho.shp"
+LANDSLIDE_FILES = [
+    "data/processed/landslide_mask_1.npy",
+    "data/processed/landslide_mask_2.npy",
+    "data/processed/landslide_mask_3.npy",
+]
+# sources of the processed masks, rasterized again for any other grid size
+BUILDINGS_SHAPEFILE = "data/raw/corte_edificacoes.shp"
+LANDSLIDE_SHAPEFILES = [
+    "data/raw/area_risco1.shp",
+    "data/raw/area_risco2.shp",
+    "data/raw/area_risco3.shp",
+]
+
+# legs of the 'prohibited' triangles (hills agents wouldnt be on in a normal situation), in native cells
+PROHIBITED_LEG_LEFT = 70
+PROHIBITED_LEG_RIGHT = 50
+
+
+@functools.lru_cache(maxsize=None)
+def raster_bounds(raster=RASTER_FILE):
+    with rasterio.open(raster) as src:
+        return src.bounds
+
+
+class GridConfig:
+    """
+    A width x height grid laid over the bounds of the georeferenced raster.
+    Cells are cell_width x cell_height metres, cell_size is the side of the
+    square cell of the same area: the metres of one move in the model
+    """
+    def __init__(self, width=NATIVE_WIDTH, height=NATIVE_HEIGHT, bounds=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.bounds = raster_bounds() if bounds is None else bounds
+        self.cell_width = (self.bounds.right - self.bounds.left) / self.width
+        self.cell_height = (self.bounds.top - self.bounds.bottom) / self.height
+        self.cell_size = (self.cell_width * self.cell_height) ** 0.5
+
+    @classmethod
+    def from_cell_size(cls, cell_size, bounds=None):
+        """
+        the grid whose cells are closest to cell_size metres
+        """
+        bounds = raster_bounds() if bounds is None else bounds
+        width = max(1, round((bounds.right - bounds.left) / cell_size))
+        height = max(1, round((bounds.top - bounds.bottom) / cell_size))
+        return cls(width, height, bounds)
+
+    @property
+    def native(self):
+        return (self.width, self.height) == (NATIVE_WIDTH, NATIVE_HEIGHT)
+
+    @property
+    def transform(self):
+        """
+        (col, row) -> map coordinates, row 0 on top (raster orientation)
+        """
+        return grid_transform(self.bounds, self.width, self.height)
+
+
+def resample(layer, width, height):
+    """
+    bilinear resampling of a (rows, cols) layer onto a width x height grid
+    over the same extent (cell centres to cell centres, exact at the same size)
+    """
+    rows, cols = layer.shape
+    ys = (np.arange(height) + 0.5) * rows / height - 0.5
+    xs = (np.arange(width) + 0.5) * cols / width - 0.5
+    yy, xx = np.meshgrid(ys, xs, indexing="ij")
+    return map_coordinates(np.asarray(layer, dtype=np.float64), [yy, xx], order=1, mode="nearest")
+
+
+def prohibited_mask(width, height, leg_left=PROHIBITED_LEG_LEFT, leg_right=PROHIBITED_LEG_RIGHT):
+    """
+    boolean (height, width) mask of the bottom-left and bottom-right triangles,
+    legs given in native cells and scaled to the grid
+    """
+    scale = width / NATIVE_WIDTH
+    ys, xs = np.mgrid[0:height, 0:width]
+    return (xs + ys < leg_left * scale) | ((width - 1 - xs) + ys < leg_right * scale)
+
+
+def _with_sidecars(shapefile):
+    shp = Path(shapefile)
+    return [shp] + [shp.with_suffix(ext) for ext in (".shx", ".dbf", ".prj") if shp.with_suffix(ext).exists()]
+
+
+def source_files(native=True):
+    """
+    files a bundle is built from: the processed masks on the native grid,
+    their raw shapefiles on any other
+    """
+    files = [Path(ELEVATION_FILE), *_with_sidecars(PATHS_SHAPEFILE)]
+    if native:
+        return files + [Path(f) for f in (OBSTACLE_FILE, *LANDSLIDE_FILES)]
+    for shp in (BUILDINGS_SHAPEFILE, *LANDSLIDE_SHAPEFILES):
+        files += _with_sidecars(shp)
+    return files
+
+
+def scenario_key(config):
+    """
+    hash of every source layer plus the grid, names the bundle on disk
+    """
+    h = hashlib.sha256()
+    h.update(f"v{BUNDLE_VERSION}:{config.width}x{config.height}:{tuple(config.bounds)}:"
+             f"{PROHIBITED_LEG_LEFT}:{PROHIBITED_LEG_RIGHT}".encode())
+    for f in source_files(config.native):
+        h.update(f.as_posix().encode())
+        h.update(f.read_bytes())
+    return h.hexdigest()[:16]
+
+
+class Scenario:
+    """
+    Preprocessed layers of one grid size, already in model orientation
+    (row 0 = bottom of the map, except terrain which the model has always used unflipped).
+    slope_penalty[y, x, k] is the slope penalty of the move from (x, y) in
+    direction MOORE_OFFSETS[k], see src/utils/slope.py.
+    config is the GridConfig (cell size in metres) of the grid.
+    landslide_arrival[w] is the timeline of landslide wave w, of the risk area
+    landslide_wave_area[w], see src/utils/landslide_timeline.py.
+    Arrays are memory-mapped read-only, so many models/processes share the same pages.
+    """
+    LAYERS = ("terrain", "obstacle_mask", "path_mask", "prohibited", "landslide_masks", "slope_penalty",
+              "landslide_arrival", "landslide_wave_area")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        for name in self.LAYERS:
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode="r"))
+        self.height, self.width = self.obstacle_mask.shape
+        self.config = GridConfig(self.width, self.height)
+
+
+def build_bundle(config, path):
+    """
+    does the GIS / raw file work once and writes one .npy per layer to path.
+    Off the native grid the masks are rasterized again from their shapefiles
+    and the terrain is resampled. The landslide timelines are derived from
+    the masks
+    """
+    width, height = config.width, config.height
+    terrain = load_elevation(NATIVE_WIDTH, NATIVE_HEIGHT)
+    if config.native:
+        obstacles = np.load(OBSTACLE_FILE)
+        landslides = [np.load(fp) for fp in LANDSLIDE_FILES]
+    else:
+        terrain = resample(terrain, width, height)
+        obstacles = rasterize_shapefile(BUILDINGS_SHAPEFILE, config.transform, width, height)
+        landslides = [rasterize_shapefile(shp, config.transform, width, height) for shp in LANDSLIDE_SHAPEFILES]
+    layers = {
+        "terrain": terrain,
+        "obstacle_mask": np.flipud(obstacles),
+        "path_mask": load_paths(width, height, PATHS_SHAPEFILE),
+        "prohibited": prohibited_mask(width, height),
+        "landslide_masks": np.stack([np.flipud(m) for m in landslides]),
+        "slope_penalty": slope_penalties(terrain, config.cell_size),
+    }
+    layers["landslide_arrival"], layers["landslide_wave_area"] = wave_timelines(
+        layers["landslide_masks"], layers["obstacle_mask"])
+    path.mkdir(parents=True, exist_ok=True)
+    for name, arr in layers.items():
+        np.save(path / f"{name}.npy", np.ascontiguousarray(arr))
+
+
+def load_scenario(width, height, cache_dir=CACHE_DIR):
+    """
+    Opens the cached bundle for this grid size, building it first if the
+    source files changed or it was never built
+    """
+    config = GridConfig(width, height)
+    cache_dir = Path(cache_dir)
+    target = cache_dir / f"scenario_{width}x{height}_{scenario_key(config)}"
+    if not target.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # build next to the target and rename, so concurrent runs never see a half written bundle
+        tmp = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".building_"))
+        try:
+            build_bundle(config, tmp)
+            os.rename(tmp, target)
+        except OSError:
+            if not target.exists():
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return Scenario(target)
@@ -0,0 +1,65 @@
+# src/utils/slope.py
+import numpy as np
+from src.mobility import MOBILITY_TYPES
+from src.utils.pathfinding import MOORE_OFFSETS
+
+UPHILL_FACTOR = 2.45    # 0,58 m/s to non pwd
+DOWNHILL_FACTOR = 2.0   # universal — gives 0.67 m/s baseline (QU et al., 2014)
+MIN_MOVE_PROBABILITY = 0.75  # prob of moving never lower than this
+
+# (dx, dy) -> index of the direction in MOORE_OFFSETS (last axis of the tensors below)
+DIRECTIONS = {offset: k for k, offset in enumerate(MOORE_OFFSETS)}
+_DIRECTION_TABLE = np.full(9, -1, dtype=np.int64)   # (dy + 1) * 3 + dx + 1 -> k
+for (_dx, _dy), _k in DIRECTIONS.items():
+    _DIRECTION_TABLE[(_dy + 1) * 3 + _dx + 1] = _k
+
+
+def direction_index(dx, dy):
+    """
+    MOORE_OFFSETS index of the move (dx, dy), works on arrays too
+    """
+    return _DIRECTION_TABLE[(np.asarray(dy) + 1) * 3 + np.asarray(dx) + 1]
+
+
+def slope_penalties(terrain, cell_size=1.0, uphill_factor=UPHILL_FACTOR, downhill_factor=DOWNHILL_FACTOR):
+    """
+    (height, width, 8) slope penalty of moving from (x, y) to its neighbour
+    in each MOORE_OFFSETS direction, inf where the neighbour is off the grid.
+    The slope is the rise per metre of cell_size (metres per cell)
+    """
+    terrain = np.asarray(terrain, dtype=np.float64)
+    height, width = terrain.shape
+    penalty = np.full((height, width, len(MOORE_OFFSETS)), np.inf)
+    for k, (dx, dy) in enumerate(MOORE_OFFSETS):
+        src = (slice(max(-dy, 0), height - max(dy, 0)), slice(max(-dx, 0), width - max(dx, 0)))
+        dst = (slice(max(dy, 0), height + min(dy, 0)), slice(max(dx, 0), width + min(dx, 0)))
+        slope = (terrain[dst] - terrain[src]) / cell_size
+        penalty[src + (k,)] = np.where(slope > 0, 1 + slope * uphill_factor,
+                              np.where(slope < 0, 1 + np.abs(slope) * downhill_factor, 1.0))
+    return penalty
+
+
+def move_probabilities(penalty, base_speed, speeds=None):
+    """
+    (len(MOBILITY_TYPES), height, width, 8) chance that an agent of each
+    mobility type moving in that direction passes the speed check
+    (effective speed, floored at MIN_MOVE_PROBABILITY; above 1 always passes).
+    speeds: relative speed of each mobility type, default their MobilityType speeds
+    """
+    if speeds is None:
+        speeds = [mt.speed for mt in MOBILITY_TYPES]
+    return np.stack([
+        np.maximum(base_speed * float(speed) / penalty, MIN_MOVE_PROBABILITY)
+        for speed in speeds
+    ])
+
+
+def expected_ticks(penalty, base_speed, speed):
+    """
+    routing weight of each move for one mobility type (relative speed): the
+    ticks it takes at that speed on that slope, at least 1. Read off the slope
+    penalty, not the move probabilities: their MIN_MOVE_PROBABILITY floor keeps
+    every move possible, but every move of the slower types hits it, so their
+    weights would all be 1 / MIN_MOVE_PROBABILITY and routes would ignore the terrain
+    """
+    return np.maximum(penalty / (base_speed * float(speed)), 1.0)
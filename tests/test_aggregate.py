@@ -0,0 +1,110 @@
+# tests/test_aggregate.py
+"""
+QuantileSketch (src/reporting/sketch.py) must answer every quantile within
+its relative accuracy, merged from partial sketches or not, and the report
+aggregator (src/reporting/aggregate.py) must only read files it has not
+seen, starting over when one it holds changed.
+"""
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from src.reporting import aggregate
+from src.reporting.aggregate import ReportAggregate
+from src.reporting.sketch import QuantileSketch
+
+REPORTS = Path("reports/all_risk_areas")
+QUANTILES = (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0)
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_merged_sketch_quantiles_within_accuracy(accuracy):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.lognormal(3, 1.5, 20000), np.zeros(500), rng.integers(1, 600, 5000)])
+    rng.shuffle(values)
+    merged = QuantileSketch(accuracy)
+    for part in np.array_split(values, 7):
+        sketch = QuantileSketch(accuracy)
+        sketch.add(part)
+        merged.merge(QuantileSketch.from_dict(sketch.to_dict()))
+    whole = QuantileSketch(accuracy)
+    whole.add(values)
+    assert merged.count == len(values)
+    assert np.array_equal(merged.counts, whole.counts) and merged.offset == whole.offset
+    for q in QUANTILES:
+        # the sketch answers with the value of rank floor(q * (n - 1))
+        true = np.quantile(values, q, method="lower")
+        assert merged.quantile(q) == pytest.approx(true, rel=accuracy * (1 + 1e-9), abs=1e-12), f"q={q}"
+
+
+def copy_reports(root, folders=("minuto_1", "final_simulacao"), per_folder=3):
+    for folder in folders:
+        (root / folder).mkdir(parents=True)
+        for path in sorted((REPORTS / folder).glob("*.csv"))[:per_folder]:
+            shutil.copy(path, root / folder / path.name)
+
+
+def expected_rows(root):
+    """
+    evacuation rates and p50 per (scenario, mobility type), read with pandas directly
+    """
+    rows = {}
+    for path in root.rglob("*_report_*.csv"):
+        frame = pd.read_csv(path)
+        frame["scenario"] = path.parent.name
+        rows.setdefault(path.parent.name, []).append(frame)
+    expected = {}
+    for scenario, frames in rows.items():
+        frame = pd.concat(frames)
+        for mobility, group in [*frame.groupby("mobility_type"), (aggregate.ALL, frame)]:
+            expected[scenario, mobility] = (len(group), group["evacuated"].mean(),
+                                            np.quantile(group["time_spent"], 0.5, method="lower"))
+    return expected
+
+
+def summary(agg):
+    return {(row["scenario"], row["mobility_type"]): (row["agents"], row["evacuation_rate"], row["time_spent_p50"])
+            for row in agg.rows()}
+
+
+def test_aggregate_matches_the_reports(tmp_path):
+    copy_reports(tmp_path)
+    agg = ReportAggregate(tmp_path)
+    assert agg.update() == 6
+    got, expected = summary(agg), expected_rows(tmp_path)
+    assert got.keys() == expected.keys()
+    for key, (agents, rate, p50) in expected.items():
+        assert got[key][:2] == (agents, pytest.approx(rate)), key
+        assert got[key][2] == pytest.approx(p50, rel=0.01), key
+
+
+def test_aggregate_only_reads_new_files(tmp_path, monkeypatch):
+    root, state = tmp_path / "reports", tmp_path / "state.json"
+    copy_reports(root)
+    first = ReportAggregate(root)
+    first.update()
+    first.save(state)
+
+    read = []
+    read_csv = pd.read_csv
+    monkeypatch.setattr(aggregate.pd, "read_csv", lambda path, **kw: read.append(path) or read_csv(path, **kw))
+
+    again = ReportAggregate.load(state, root)
+    assert again.update() == 0 and read == [], "a second run read files again"
+    assert summary(again) == summary(first)
+
+    # a new file is read on its own
+    new = root / "minuto_1" / "all_done_report_20990101-000000.csv"
+    shutil.copy(sorted((REPORTS / "minuto_3").glob("*.csv"))[0], new)
+    assert again.update() == 1 and read == [root / "minuto_1" / new.name]
+
+    # a file already aggregated changed: everything is read again
+    read.clear()
+    frame = read_csv(new)
+    frame["evacuated"] = True
+    frame.to_csv(new, index=False)
+    assert again.update() == 7 and len(read) == 7, "a changed file did not trigger a full re-read"
+    fresh = ReportAggregate(root)
+    fresh.update()
+    assert summary(again) == summary(fresh)
@@ -0,0 +1,58 @@
+# tests/test_checkpoint.py
+"""
+A run snapshotted at some tick and restored (src/model/checkpoint.py) must
+continue exactly as the uninterrupted run: reports, grid, fronts and random
+stream, on both engines.
+"""
+import numpy as np
+import pytest
+from src.model.checkpoint import fork, restore, snapshot
+from src.model.simulation import EvacuationModel
+
+KWARGS = dict(num_agents=480, active_areas=[0, 1, 2], seed=0,
+              safe_zones=[(0, 179, None), (110, 90, 40)], congestion_weight=5, routing_interval=10)
+
+
+def reports(reports_dir):
+    """
+    {folder: csv text} (file names carry a timestamp)
+    """
+    return {path.parent.name: path.read_text() for path in sorted(reports_dir.glob("*/*.csv"))}
+
+
+def assert_same_run(a, b):
+    assert a.current_step == b.current_step, "run length differs"
+    assert a.agent_counts == b.agent_counts, "outcomes differ"
+    assert a.reporter.data == b.reporter.data, "reports differ"
+    assert np.array_equal(a.grid.occupancy, b.grid.occupancy), "grids differ"
+    assert [w.front for w in a.landslides] == [w.front for w in b.landslides], "fronts differ"
+    assert a.random.random() == b.random.random(), "random streams differ"
+
+
+@pytest.mark.parametrize("engine", ["mesa", "array"])
+@pytest.mark.parametrize("tick", [1, 40, 120])   # 120: after the minute_1 report
+def test_restored_run_continues_the_straight_run(engine, tick, tmp_path):
+    straight = EvacuationModel(220, 180, engine=engine, reports_dir=tmp_path / "straight", **KWARGS)
+    straight.run_until_done()
+    assert straight.current_step > tick
+
+    model = EvacuationModel(220, 180, engine=engine, reports_dir=tmp_path / "restored", **KWARGS)
+    for _ in range(tick):
+        model.step()
+    restored = restore(snapshot(model))
+    del model
+    restored.run_until_done()
+
+    assert_same_run(straight, restored)
+    assert reports(tmp_path / "straight") == reports(tmp_path / "restored"), "report files differ"
+
+
+def test_fork_without_changes_is_a_restore(tmp_path):
+    model = EvacuationModel(220, 180, engine="array", reports_dir=tmp_path, **KWARGS)
+    for _ in range(40):
+        model.step()
+    data = snapshot(model)
+    a, b = restore(data), fork(data)
+    a.run_until_done()
+    b.run_until_done()
+    assert_same_run(a, b)
@@ -0,0 +1,53 @@
+# tests/test_crowd_engine.py
+"""
+The array engine (src/model/crowd.py) must give the very same seeded run as
+one Mesa Evacuee per agent: reports, positions, grid and random stream.
+The batched engine draws from numpy instead, so it is only checked to be
+reproducible and to start from the same placement.
+"""
+import numpy as np
+import pytest
+from src.model.simulation import EvacuationModel
+
+SCENARIOS = {
+    "one area": dict(num_agents=300, active_areas=[1]),
+    "all areas": dict(num_agents=480, active_areas=[0, 1, 2]),
+    "crowded": dict(num_agents=2000, active_areas=[0, 1, 2]),
+    "shelters and congestion": dict(num_agents=480, active_areas=[0, 1, 2],
+                                    safe_zones=[(0, 179, None), (110, 90, 40), (60, 30, 60)],
+                                    congestion_weight=5, routing_interval=10),
+}
+SLOW = {"crowded"}
+
+
+def run(engine, reports_dir, **kwargs):
+    model = EvacuationModel(220, 180, engine=engine, reports_dir=reports_dir / engine, **kwargs)
+    model.run_until_done()
+    return model
+
+
+@pytest.mark.parametrize("seed", range(2))
+@pytest.mark.parametrize("scenario", [
+    pytest.param(name, marks=pytest.mark.slow) if name in SLOW else name for name in SCENARIOS
+])
+def test_engines_give_the_same_run(scenario, seed, tmp_path):
+    kwargs = dict(SCENARIOS[scenario], seed=seed)
+    a, b = run("mesa", tmp_path, **kwargs), run("array", tmp_path, **kwargs)
+    assert a.current_step == b.current_step, "run length differs"
+    assert a.agent_counts == b.agent_counts, "outcomes differ"
+    assert a.reporter.data == b.reporter.data, "reports differ"
+    assert [e.pos for e in a.evacuees] == list(zip(b.crowd.x.tolist(), b.crowd.y.tolist())), "positions differ"
+    assert np.array_equal(a.grid.occupancy, b.grid.occupancy), "grids differ"
+    assert a.random.random() == b.random.random(), "random streams differ"
+
+
+def test_batched_engine_is_reproducible(tmp_path):
+    kwargs = dict(SCENARIOS["all areas"], seed=0)
+    start = EvacuationModel(220, 180, engine="array", reports_dir=tmp_path / "start", **kwargs)
+    a, b = run("batched", tmp_path / "a", **kwargs), run("batched", tmp_path / "b", **kwargs)
+    assert a.reporter.data == b.reporter.data, "reports differ"
+    assert np.array_equal(a.grid.occupancy, b.grid.occupancy), "grids differ"
+    assert sum(a.agent_counts.values()) == a.num_agents
+    batched = EvacuationModel(220, 180, engine="batched", reports_dir=tmp_path / "start", **kwargs)
+    assert np.array_equal(start.crowd.x, batched.crowd.x) and np.array_equal(start.crowd.y, batched.crowd.y), \
+        "placements differ"
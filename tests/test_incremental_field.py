@@ -0,0 +1,67 @@
+# tests/test_incremental_field.py
+"""
+The LPA* field (src/utils/incremental_field.py) must stay equal to a full
+distance_field run on the same mask, next hops included, whatever cells get
+blocked or freed and whether the change is repaired or rebuilt.
+"""
+import numpy as np
+import pytest
+from src.utils.incremental_field import IncrementalDistanceField
+from src.utils.pathfinding import distance_field
+
+WIDTH, HEIGHT = 60, 45
+GOALS = [(0, HEIGHT - 1), (WIDTH - 1, 0), (30, 20)]
+
+
+def random_grid(rng):
+    path_mask = rng.random((HEIGHT, WIDTH)) < 0.2
+    obstacle_mask = rng.random((HEIGHT, WIDTH)) < 0.15
+    edge_weight = 1.0 + rng.random((HEIGHT, WIDTH, 8))
+    return path_mask, obstacle_mask, edge_weight
+
+
+def assert_matches(field, path_mask, obstacle_mask, edge_weight):
+    dist, next_hop = distance_field(WIDTH, HEIGHT, GOALS, path_mask=path_mask,
+                                    obstacle_mask=obstacle_mask, edge_weight=edge_weight)
+    assert np.array_equal(field.dist, dist), "distances differ"
+    assert np.array_equal(field.next_hop, next_hop), "next hops differ"
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_repair_matches_distance_field(seed, weighted):
+    rng = np.random.default_rng(seed)
+    path_mask, mask, edge_weight = random_grid(rng)
+    edge_weight = edge_weight if weighted else None
+    field = IncrementalDistanceField(WIDTH, HEIGHT, GOALS, path_mask=path_mask,
+                                     obstacle_mask=mask, edge_weight=edge_weight)
+    assert_matches(field, path_mask, mask, edge_weight)
+    repaired = 0
+    for flips in (1, 5, 20, 60, 400):
+        for _ in range(3):
+            # a few cells change, goals included (a full shelter closing and reopening)
+            mask = mask.copy()
+            ys, xs = rng.integers(HEIGHT, size=flips), rng.integers(WIDTH, size=flips)
+            mask[ys, xs] = ~mask[ys, xs]
+            rebuilds = field.rebuilds
+            field.update_mask(mask)
+            repaired += field.rebuilds == rebuilds
+            assert_matches(field, path_mask, mask, edge_weight)
+    assert repaired, "every change was rebuilt"
+    assert field.rebuilds, "no change was large enough to rebuild"
+
+
+def test_repair_after_new_costs():
+    rng = np.random.default_rng(0)
+    path_mask, mask, edge_weight = random_grid(rng)
+    field = IncrementalDistanceField(WIDTH, HEIGHT, GOALS, path_mask=path_mask,
+                                     obstacle_mask=mask, edge_weight=edge_weight)
+    cost = 1.0 + rng.random(WIDTH * HEIGHT)
+    field.update_costs(cost)
+    mask = mask.copy()
+    mask[10:20, 25] = True
+    field.update_mask(mask)
+    dist, next_hop = distance_field(WIDTH, HEIGHT, GOALS, obstacle_mask=mask,
+                                    edge_weight=edge_weight, cell_cost=cost)
+    assert np.array_equal(field.dist, dist), "distances differ"
+    assert np.array_equal(field.next_hop, next_hop), "next hops differ"
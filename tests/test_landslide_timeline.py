@@ -0,0 +1,68 @@
+# tests/test_landslide_timeline.py
+"""
+A landslide wave replaying its cached timeline (src/utils/landslide_timeline.py)
+must give the very same run as a wave grown live (timeline=None), whatever
+the live grid does to the front: evacuees stopping it, another wave's
+landslide in its way, a safe zone on its own base.
+"""
+import copy
+import numpy as np
+import pytest
+from src.agents.landslide import Landslide
+from src.model import simulation
+from src.model.simulation import EvacuationModel
+from src.utils.landslide_timeline import wave_timelines
+from src.utils.scenario import load_scenario
+
+
+def overlapping_scenario():
+    """
+    the native scenario with risk area 2 replaced by area 0 moved 6 cells
+    right, so two waves grow over the same cells
+    """
+    scenario = copy.copy(load_scenario(220, 180))
+    masks = np.array(scenario.landslide_masks)
+    masks[2] = np.roll(masks[0], 6, axis=1)
+    scenario.landslide_masks = masks
+    scenario.landslide_arrival, scenario.landslide_wave_area = wave_timelines(masks, scenario.obstacle_mask)
+    return scenario
+
+
+SCENARIOS = {
+    "evacuees in the way": lambda: dict(num_agents=2000, active_areas=[0, 1, 2]),
+    "overlapping waves": lambda: dict(num_agents=480, active_areas=[0, 2], scenario=overlapping_scenario()),
+    # (117, 0) lies on the base row of risk area 1's wave
+    "safe zone on a wave base": lambda: dict(num_agents=480, active_areas=[1],
+                                             safe_zones=[(0, 179, None), (117, 0, None), (121, 0, 5)]),
+}
+
+
+class LiveLandslide(Landslide):
+    def __init__(self, *args, timeline=None, **kwargs):
+        super().__init__(*args, timeline=None, **kwargs)
+
+
+def run(reports_dir, **kwargs):
+    model = EvacuationModel(220, 180, engine="array", reports_dir=reports_dir, **kwargs)
+    model.run_until_done()
+    return model
+
+
+@pytest.mark.parametrize("seed", range(2))
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_replay_matches_live_growth(scenario, seed, tmp_path, monkeypatch):
+    replayed = run(tmp_path / "replayed", seed=seed, **SCENARIOS[scenario]())
+    with monkeypatch.context() as patch:
+        patch.setattr(simulation, "Landslide", LiveLandslide)
+        live = run(tmp_path / "live", seed=seed, **SCENARIOS[scenario]())
+    assert all(wave.arrival is not None for wave in replayed.landslides), "no wave replayed its timeline"
+    assert all(wave.arrival is None for wave in live.landslides)
+    assert replayed.current_step == live.current_step, "run length differs"
+    assert replayed.agent_counts == live.agent_counts, "outcomes differ"
+    assert replayed.reporter.data == live.reporter.data, "reports differ"
+    assert np.array_equal(replayed.grid.occupancy, live.grid.occupancy), "grids differ"
+    assert np.array_equal(replayed.grid.buried, live.grid.buried), "buried buildings differ"
+    for a, b in zip(replayed.landslides, live.landslides):
+        assert np.array_equal(a.visited, b.visited), f"{a.unique_id} reached other cells"
+        assert np.array_equal(a.front_mask, b.front_mask), f"{a.unique_id} fronts differ"
+    assert replayed.random.random() == live.random.random(), "random streams differ"
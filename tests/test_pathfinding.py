@@ -0,0 +1,45 @@
+# tests/test_pathfinding.py
+"""
+a_star_path must return a shortest path: its cost equals the distance_field
+distance of the start, with and without footpaths and edge weights.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from src.utils.pathfinding import MOORE_OFFSETS, a_star_path, distance_field
+
+WIDTH, HEIGHT = 50, 40
+
+
+def path_cost(path, path_mask, edge_weight):
+    cost = 0.0
+    for (ax, ay), (bx, by) in zip(path, path[1:]):
+        step = 1.0 if path_mask[by, bx] else 2.0
+        if edge_weight is not None:
+            step *= edge_weight[ay, ax, MOORE_OFFSETS.index((bx - ax, by - ay))]
+        cost += step
+    return cost
+
+
+@pytest.mark.parametrize("footpaths", [False, True])
+@pytest.mark.parametrize("weighted", [False, True])
+def test_a_star_is_shortest(footpaths, weighted):
+    rng = np.random.default_rng(0)
+    grid = SimpleNamespace(width=WIDTH, height=HEIGHT)
+    for _ in range(10):
+        obstacle_mask = rng.random((HEIGHT, WIDTH)) < 0.25
+        path_mask = rng.random((HEIGHT, WIDTH)) < (0.3 if footpaths else 0.0)
+        edge_weight = 1.0 + rng.random((HEIGHT, WIDTH, 8)) if weighted else None
+        goal = (int(rng.integers(WIDTH)), int(rng.integers(HEIGHT)))
+        obstacle_mask[goal[1], goal[0]] = False
+        dist, _ = distance_field(WIDTH, HEIGHT, [goal], path_mask=path_mask,
+                                 obstacle_mask=obstacle_mask, edge_weight=edge_weight)
+        for _ in range(10):
+            start = (int(rng.integers(WIDTH)), int(rng.integers(HEIGHT)))
+            path = a_star_path(grid, start, goal, path_mask=path_mask,
+                               obstacle_mask=obstacle_mask, edge_weight=edge_weight)
+            if not np.isfinite(dist[start[1], start[0]]):
+                assert path == [], "unreachable goal got a path"
+                continue
+            assert path[0] == start and path[-1] == goal
+            assert path_cost(path, path_mask, edge_weight) == pytest.approx(dist[start[1], start[0]])
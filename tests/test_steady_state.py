@@ -0,0 +1,47 @@
+# tests/test_steady_state.py
+"""
+Fast-forwarding a steady state (EvacuationModel._fast_forward) must write
+exactly the reports of the full run: same folders, same rows, same end.
+Capped shelters fill up early, after which everyone left only waits to
+get stuck.
+"""
+import numpy as np
+import pytest
+from src.model.simulation import EvacuationModel
+
+SCENARIOS = {
+    "capped shelters": dict(num_agents=300, active_areas=[0, 1, 2], safe_zones=[(0, 179, 40), (110, 90, 30)], seed=1),
+    # steady from about tick 65 on, so the minute_1 report falls in the skipped ticks
+    "minute_1 skipped": dict(num_agents=100, enable_landslide=False, safe_zones=[(0, 179, 5)], seed=1),
+}
+
+
+def run(reports_dir, **kwargs):
+    model = EvacuationModel(220, 180, reports_dir=reports_dir, **kwargs)
+    model.run_until_done()
+    return model
+
+
+def reports(reports_dir):
+    """
+    {folder: csv text} (file names carry a timestamp)
+    """
+    return {path.parent.name: path.read_text() for path in sorted(reports_dir.glob("*/*.csv"))}
+
+
+@pytest.mark.parametrize("engine", ["mesa", "array"])
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_fast_forward_writes_the_full_run(engine, scenario, tmp_path):
+    kwargs = dict(SCENARIOS[scenario], engine=engine)
+    fast = run(tmp_path / "fast", steady_ticks=10, **kwargs)
+    full = run(tmp_path / "full", steady_ticks=None, **kwargs)
+    assert fast.fast_forwarded > 0, "the run never reached a steady state"
+    assert full.fast_forwarded == 0
+    assert fast.current_step == full.current_step, "run length differs"
+    assert fast.agent_counts == full.agent_counts, "outcomes differ"
+    assert fast.reporter.data == full.reporter.data, "reports differ"
+    written = reports(tmp_path / "fast")
+    assert written == reports(tmp_path / "full"), "report files differ"
+    if scenario == "minute_1 skipped":
+        assert "minute_1" in written and (fast.current_step - fast.fast_forwarded) * fast.time_per_step < 60
+    assert np.array_equal(fast.grid.occupancy, full.grid.occupancy), "grids differ"